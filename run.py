@@ -5,6 +5,7 @@ WhatsPayAI Startup Script
 Run the WhatsApp AI assistant server.
 """
 
+import importlib.util
 import os
 import sys
 
@@ -23,16 +24,36 @@ def main():
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
     debug = os.getenv("DEBUG", "True").lower() == "true"
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+    # Use the C-accelerated event loop and HTTP parser when installed
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
 
     print(f"🚀 Starting WhatsPayAI server on {host}:{port}")
     print(f"📊 Debug mode: {debug}")
     print(f"🌐 Network: {os.getenv('HATHOR_NETWORK', 'testnet')}")
+    print(f"⚙️ Event loop: {loop} | HTTP parser: {http}")
+
+    # State is held in process and persisted to one shared state.json and
+    # state.log; several workers would each number, rotate and snapshot those
+    # files independently and corrupt persisted balances
+    if workers > 1:
+        print(
+            f"⚠️ WEB_CONCURRENCY={workers} ignored: application state is kept "
+            "in process and written to shared state files, using 1 worker"
+        )
+        workers = 1
 
     uvicorn.run(
         "src.app:app",
         host=host,
         port=port,
         reload=debug,
+        workers=workers,
+        loop=loop,
+        http=http,
+        access_log=debug,
         log_level="info" if debug else "warning",
     )
 
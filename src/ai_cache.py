@@ -0,0 +1,168 @@
+"""
+AI Response Cache
+
+Two-tier cache for AI query responses: an exact-match LRU keyed on the
+normalized prompt, and an optional semantic tier that matches prompts by
+embedding cosine similarity.
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# numpy is only needed for the optional semantic tier
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "2048"))
+AI_CACHE_SEMANTIC = os.getenv("AI_CACHE_SEMANTIC", "false").lower() == "true"
+AI_CACHE_SIMILARITY = float(os.getenv("AI_CACHE_SIMILARITY", "0.95"))
+
+if AI_CACHE_SEMANTIC and not NUMPY_AVAILABLE:
+    logger.warning("numpy not available, semantic AI cache disabled")
+
+# (response_text, input_tokens, output_tokens)
+CachedResponse = Tuple[str, int, int]
+
+
+def normalize_prompt(message: str) -> str:
+    """
+    Normalize a prompt for exact-match cache lookups.
+
+    Args:
+        message: User's query text
+
+    Returns:
+        Lowercased prompt with collapsed whitespace
+    """
+    return " ".join(message.lower().split())
+
+
+def semantic_cache_enabled() -> bool:
+    """Check whether the embedding-based cache tier is active."""
+    return AI_CACHE_SEMANTIC and NUMPY_AVAILABLE
+
+
+class ResponseCache:
+    """Bounded LRU cache of AI responses with an optional embedding index."""
+
+    def __init__(
+        self, max_size: int = AI_CACHE_SIZE, similarity: float = AI_CACHE_SIMILARITY
+    ):
+        self.max_size = max_size
+        self.similarity = similarity
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+
+        # Embedding index: one matrix row per cached prompt that has an embedding
+        self._matrix = None
+        self._slots: Dict[str, int] = {}  # prompt key -> matrix row
+        self._slot_keys: List[Optional[str]] = []  # matrix row -> prompt key
+        self._free_slots: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Look up a response by normalized prompt."""
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def get_similar(self, embedding: Sequence[float]) -> Optional[CachedResponse]:
+        """
+        Look up the response for the most similar cached prompt.
+
+        Args:
+            embedding: Embedding vector of the incoming prompt
+
+        Returns:
+            Cached response if the best match clears the similarity threshold
+        """
+        if self._matrix is None or not self._slots:
+            return None
+
+        # Unused and evicted rows are all zeros, so they score 0 and never match
+        scores = self._matrix[: len(self._slot_keys)] @ self._unit_vector(embedding)
+
+        best = int(scores.argmax())
+        if scores[best] < self.similarity or self._slot_keys[best] is None:
+            return None
+
+        return self.get(self._slot_keys[best])
+
+    def put(
+        self,
+        key: str,
+        value: CachedResponse,
+        embedding: Optional[Sequence[float]] = None,
+    ):
+        """
+        Store a response, evicting the least recently used entry when full.
+
+        Args:
+            key: Normalized prompt
+            value: Response tuple to cache
+            embedding: Optional embedding of the prompt for semantic lookups
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        # Evict first so a freed embedding row is available for the new key
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self._remove_embedding(evicted)
+
+        if embedding is not None and key not in self._slots:
+            self._add_embedding(key, embedding)
+
+    def clear(self):
+        """Remove all cached responses."""
+        self._entries.clear()
+        self._matrix = None
+        self._slots.clear()
+        self._slot_keys.clear()
+        self._free_slots.clear()
+
+    @staticmethod
+    def _unit_vector(embedding: Sequence[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _add_embedding(self, key: str, embedding: Sequence[float]):
+        vector = self._unit_vector(embedding)
+
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_keys[slot] = key
+        else:
+            slot = len(self._slot_keys)
+            self._slot_keys.append(key)
+
+        self._matrix[slot] = vector
+        self._slots[key] = slot
+
+    def _remove_embedding(self, key: str):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+
+        self._matrix[slot] = 0.0
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
+
+
+# Global response cache instance
+response_cache = ResponseCache()
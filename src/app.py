@@ -2,84 +2,77 @@
 WhatsPayAI - Main FastAPI Application
 
 A WhatsApp-based AI assistant that uses feeless Hathor micro-payments for billing
-and JSON file-backed state persistence.
+and JSON file-backed state persistence (snapshot + append-only change log).
 """
 
+import asyncio
 import atexit
-import json
 import logging
 import os
-from typing import Dict, List
+import sys
+from functools import lru_cache
+from typing import Optional
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import PlainTextResponse
+from anyio import to_thread
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
-from .handlers.ai_query import handle_ai_query
+from .handlers.ai_query import handle_ai_query, load_encoder
 from .handlers.balance import handle_balance_query
 from .handlers.help import handle_help_request
 from .handlers.payment import handle_payment_request
-from .intent import classify_intent
+from .http_client import close_http_client
+from .intent import classify_intent_async, stop_intent_batcher
+from .state import (  # noqa: F401 - state dicts re-exported for existing imports
+    balances,
+    deposit_queue,
+    load_state,
+    save_state,
+    stats_totals,
+    usage_logs,
+)
+from .state_store import STATE_FLUSH_MS, close_log, flush_events
 from .twilio_client import send_whatsapp_message
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global state - In-memory dictionaries for fast access
-balances: Dict[str, float] = {}  # user_id -> HTR balance
-usage_logs: Dict[str, List[Dict]] = {}  # user_id -> list of usage entries
-deposit_queue: Dict[str, Dict] = {}  # address -> user_info
-
-# FastAPI app instance
-app = FastAPI(
-    title="WhatsPayAI", description="WhatsApp AI Assistant with Hathor Payments"
-)
-
-# State file path
-STATE_FILE = "state.json"
-
+# Worker threads available to blocking calls offloaded from the event loop
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "100"))
 
-def load_state():
-    """Load application state from JSON file on startup."""
-    global balances, usage_logs, deposit_queue
-
-    try:
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, "r") as f:
-                state = json.load(f)
-                balances = state.get("balances", {})
-                usage_logs = state.get("usage_logs", {})
-                deposit_queue = state.get("deposit_queue", {})
-            logger.info(f"Loaded state from {STATE_FILE}")
-        else:
-            logger.info("No state file found, starting with empty state")
-    except Exception as e:
-        logger.error(f"Error loading state: {e}")
+# Background task that flushes batched state log writes
+_flush_task: Optional[asyncio.Task] = None
 
 
-def save_state():
-    """Save current application state to JSON file."""
-    try:
-        state = {
-            "balances": balances,
-            "usage_logs": usage_logs,
-            "deposit_queue": deposit_queue,
-        }
-        with open(STATE_FILE, "w") as f:
-            json.dump(state, f, indent=2)
-        logger.info(f"Saved state to {STATE_FILE}")
-    except Exception as e:
-        logger.error(f"Error saving state: {e}")
+async def flush_state_log():
+    """Periodically write buffered state log events in a single batch."""
+    while True:
+        await asyncio.sleep(STATE_FLUSH_MS / 1000)
+        try:
+            await to_thread.run_sync(flush_events)
+        except Exception as e:
+            logger.error(f"Error flushing state log: {e}")
 
 
-@app.on_event("startup")
 async def startup_event():
     """Initialize application on startup."""
+    global _flush_task
+
     logger.info("Starting WhatsPayAI application...")
 
+    # Raise the AnyIO default of 40 threads so concurrent blocking API calls
+    # do not queue behind each other
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+    # Load the token encoder in the background; until it is ready token
+    # counts use the character estimate
+    asyncio.get_running_loop().run_in_executor(None, load_encoder)
+
     # Load existing state
     load_state()
+    _flush_task = asyncio.create_task(flush_state_log())
 
     # Import and start scheduler
     from .scheduler import start_scheduler
@@ -92,63 +85,63 @@ async def startup_event():
     logger.info("WhatsPayAI application started successfully")
 
 
-@app.on_event("shutdown")
 async def shutdown_event():
     """Clean up on application shutdown."""
     logger.info("Shutting down WhatsPayAI application...")
-    save_state()
+
+    from .scheduler import stop_scheduler
+
+    stop_scheduler()
+    if _flush_task is not None:
+        _flush_task.cancel()
+    stop_intent_batcher()
+
+    # Serialize and write the snapshot on a worker thread, off the event loop
+    await to_thread.run_sync(save_state)
+    close_log()
+    await close_http_client()
 
 
-@app.get("/")
 async def root():
     """Health check endpoint."""
     return {"status": "WhatsPayAI is running", "version": "1.0.0"}
 
 
-@app.post("/webhook")
-async def whatsapp_webhook(request: Request):
-    """
-    Handle incoming WhatsApp messages from Twilio webhook.
+# Intent -> handler taking (sender, message_body)
+_INTENT_DISPATCH = {
+    "payment_intent": handle_payment_request,
+    "balance_intent": lambda sender, _: handle_balance_query(sender),
+    "ai_query_intent": handle_ai_query,
+    "help_intent": lambda *_: handle_help_request(),
+}
 
-    Expected webhook format from Twilio:
-    - From: sender's WhatsApp number
-    - Body: message text content
-    """
-    try:
-        # Parse Twilio webhook data
-        form_data = await request.form()
-        sender = form_data.get("From", "").replace("whatsapp:", "")
-        message_body = form_data.get("Body", "").strip()
 
-        if not sender or not message_body:
-            raise HTTPException(status_code=400, detail="Missing From or Body")
+async def _dispatch_message(sender: str, message_body: str):
+    """
+    Classify a message, run the matching handler and reply via WhatsApp.
 
-        logger.info(f"Received message from {sender}: {message_body}")
+    Runs as a background task after the webhook has been acknowledged, so
+    slow OpenAI and Twilio calls stay out of Twilio's webhook timeout window.
 
-        # Classify user intent
-        intent = classify_intent(message_body)
+    Args:
+        sender: Sender's phone number (without whatsapp: prefix)
+        message_body: Message text content
+    """
+    try:
+        # Classify user intent (batched with concurrent messages)
+        intent = await classify_intent_async(message_body)
         logger.info(f"Classified intent: {intent}")
 
-        # Route to appropriate handler based on intent
-        if intent == "payment_intent":
-            response = await handle_payment_request(sender, message_body)
-        elif intent == "balance_intent":
-            response = await handle_balance_query(sender)
-        elif intent == "ai_query_intent":
-            response = await handle_ai_query(sender, message_body)
-        elif intent == "help_intent":
-            response = await handle_help_request()
-        else:
-            # Default to AI query for unclassified messages
-            response = await handle_ai_query(sender, message_body)
+        # Route to appropriate handler based on intent, defaulting to an
+        # AI query for unclassified messages
+        handler = _INTENT_DISPATCH.get(intent, handle_ai_query)
+        response = await handler(sender, message_body)
 
         # Send response back via WhatsApp
         await send_whatsapp_message(sender, response)
 
-        return PlainTextResponse("OK", status_code=200)
-
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
+        logger.error(f"Error processing message from {sender}: {e}")
         # Send error message to user
         try:
             await send_whatsapp_message(
@@ -158,20 +151,81 @@ async def whatsapp_webhook(request: Request):
         except:
             pass
 
+
+async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
+    """
+    Handle incoming WhatsApp messages from Twilio webhook.
+
+    The message is acknowledged immediately and processed in the background.
+
+    Expected webhook format from Twilio:
+    - From: sender's WhatsApp number
+    - Body: message text content
+    """
+    try:
+        # Parse Twilio webhook data
+        form_data = await request.form()
+        # Interned so every per-user dict shares one key object per sender
+        sender = sys.intern(form_data.get("From", "").replace("whatsapp:", ""))
+        message_body = form_data.get("Body", "").strip()
+    except Exception as e:
+        logger.error(f"Error parsing webhook: {e}")
         return PlainTextResponse("Error", status_code=500)
 
+    if not sender or not message_body:
+        raise HTTPException(status_code=400, detail="Missing From or Body")
+
+    logger.info(f"Received message from {sender}: {message_body}")
+
+    background_tasks.add_task(_dispatch_message, sender, message_body)
+
+    return PlainTextResponse("OK", status_code=200)
+
 
-@app.get("/stats")
 async def get_stats():
     """Get application statistics (for monitoring)."""
     return {
         "total_users": len(balances),
-        "total_balance": sum(balances.values()),
+        "total_balance": stats_totals["total_balance"],
         "pending_deposits": len(deposit_queue),
-        "total_queries": sum(len(logs) for logs in usage_logs.values()),
+        "total_queries": stats_totals["total_queries"],
     }
 
 
+@lru_cache(maxsize=None)
+def create_app() -> FastAPI:
+    """
+    Build the FastAPI application and register its routes and hooks.
+
+    Cached, so every caller (the module-level app, test fixtures) shares one
+    instance and routes are only registered once per process.
+
+    Returns:
+        Configured FastAPI app
+    """
+    app = FastAPI(
+        title="WhatsPayAI",
+        description="WhatsApp AI Assistant with Hathor Payments",
+        default_response_class=ORJSONResponse,
+    )
+
+    # Compress larger responses for clients that accept gzip
+    app.add_middleware(GZipMiddleware, minimum_size=512)
+
+    app.add_event_handler("startup", startup_event)
+    app.add_event_handler("shutdown", shutdown_event)
+
+    app.add_api_route("/", root, methods=["GET"])
+    app.add_api_route("/webhook", whatsapp_webhook, methods=["POST"])
+    app.add_api_route("/stats", get_stats, methods=["GET"])
+
+    return app
+
+
+# FastAPI app instance
+app = create_app()
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -6,39 +6,97 @@ Handles AI-powered text processing and question answering requests.
 
 import logging
 import os
-from datetime import datetime
-from typing import Optional, Tuple
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
-import openai
 from dotenv import load_dotenv
 
+from ..ai_cache import normalize_prompt, response_cache, semantic_cache_enabled
+from ..http_client import get_openai_client
+from ..state import balances, credit_balance, debit_balance, record_usage
+
+# tiktoken is optional; token counts fall back to a character heuristic
+try:
+    import tiktoken
+
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
 logger = logging.getLogger(__name__)
 
+# The async OpenAI client comes from get_openai_client(), on the shared
+# connection pool
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if not OPENAI_API_KEY:
+    logger.warning("OpenAI API key not found in environment variables")
+
 # Configuration
 COST_PER_100_TOKENS = float(os.getenv("COST_PER_100_TOKENS", "0.01"))
 MAX_TOKENS = 500  # Maximum tokens for response
 MAX_INPUT_LENGTH = 2000  # Maximum input message length
+EMBEDDING_MODEL = "text-embedding-3-small"  # Model for semantic cache lookups
+# Fraction of the normal cost charged for responses served from the cache
+AI_CACHE_COST_FACTOR = float(os.getenv("AI_CACHE_COST_FACTOR", "0.1"))
+
 
+# Token encoder, set by load_encoder(); counts use the character estimate
+# until it is loaded
+_ENCODER = None
 
+
+def load_encoder():
+    """
+    Load the tiktoken encoder for the chat model, if available.
+
+    The first load downloads the BPE ranks, so this runs in a worker thread
+    after startup instead of at import, where an offline host would stall.
+
+    Billing note: queries handled before the encoder is ready are costed with
+    the character estimate, later ones with tiktoken counts, so the same
+    query can cost slightly differently during startup. The count cache is
+    cleared once the encoder is set, so estimates are never reused after it.
+    """
+    global _ENCODER
+
+    if not TIKTOKEN_AVAILABLE:
+        logger.warning("tiktoken not available, using character-based estimate")
+        return
+
+    try:
+        encoder = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except Exception as e:
+        logger.warning(f"Failed to load tiktoken encoder: {e}")
+        return
+
+    # Set the encoder before clearing, so nothing cached after the clear can
+    # hold a character estimate
+    _ENCODER = encoder
+    count_tokens_estimate.cache_clear()
+    logger.info("tiktoken encoder loaded, token counts now use the model encoding")
+
+
+@lru_cache(maxsize=4096)
 def count_tokens_estimate(text: str) -> int:
     """
-    Estimate token count for text.
+    Count tokens for text.
 
-    Simple estimation: ~4 characters per token for English text.
-    In production, use tiktoken for accurate counting.
+    Uses the model's tiktoken encoding once load_encoder() has run, otherwise
+    estimates ~4 characters per token for English text.
 
     Args:
         text: Input text
 
     Returns:
-        Estimated token count
+        Token count (at least 1)
     """
+    if _ENCODER is not None:
+        return max(1, len(_ENCODER.encode(text)))
+
     return max(1, len(text) // 4)
 
 
@@ -61,6 +119,9 @@ async def process_ai_query(message: str) -> Tuple[str, int, int]:
     """
     Process AI query using OpenAI API.
 
+    The completion is streamed so the event loop stays free for other
+    webhooks while tokens arrive.
+
     Args:
         message: User's message/query
 
@@ -68,6 +129,10 @@ async def process_ai_query(message: str) -> Tuple[str, int, int]:
         Tuple of (response_text, input_tokens, output_tokens)
     """
     try:
+        openai_client = get_openai_client()
+        if openai_client is None:
+            raise Exception("OpenAI API client not initialized")
+
         # Estimate input tokens
         input_tokens = count_tokens_estimate(message)
 
@@ -78,8 +143,8 @@ async def process_ai_query(message: str) -> Tuple[str, int, int]:
             "Keep responses under 500 tokens when possible."
         )
 
-        # Make OpenAI API call
-        response = openai.ChatCompletion.create(
+        # Make streaming OpenAI API call
+        stream = await openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -87,10 +152,16 @@ async def process_ai_query(message: str) -> Tuple[str, int, int]:
             ],
             max_tokens=MAX_TOKENS,
             temperature=0.7,
+            stream=True,
         )
 
-        # Extract response
-        ai_response = response.choices[0].message.content.strip()
+        # Collect streamed response
+        chunks = []
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+
+        ai_response = "".join(chunks).strip()
         output_tokens = count_tokens_estimate(ai_response)
 
         logger.info(
@@ -107,6 +178,30 @@ async def process_ai_query(message: str) -> Tuple[str, int, int]:
             raise Exception("Sorry, I encountered an error processing your request.")
 
 
+async def embed_prompt(message: str) -> Optional[List[float]]:
+    """
+    Compute an embedding for semantic cache lookups.
+
+    Args:
+        message: User's query text
+
+    Returns:
+        Embedding vector, or None if the embedding call fails
+    """
+    openai_client = get_openai_client()
+    if openai_client is None:
+        return None
+
+    try:
+        response = await openai_client.embeddings.create(
+            model=EMBEDDING_MODEL, input=message
+        )
+        return response.data[0].embedding
+    except Exception as e:
+        logger.warning(f"OpenAI embedding error: {e}")
+        return None
+
+
 async def handle_ai_query(user_id: str, message: str) -> str:
     """
     Handle AI query requests with billing and balance checking.
@@ -119,9 +214,6 @@ async def handle_ai_query(user_id: str, message: str) -> str:
         Reply message for the user
     """
     try:
-        # Import here to avoid circular imports
-        from ..app import balances, usage_logs
-
         # Validate input length
         if len(message) > MAX_INPUT_LENGTH:
             return (
@@ -129,9 +221,6 @@ async def handle_ai_query(user_id: str, message: str) -> str:
                 f"Please keep it under {MAX_INPUT_LENGTH} characters."
             )
 
-        # Check user balance
-        current_balance = balances.get(user_id, 0.0)
-
         # Estimate cost before processing
         estimated_input_tokens = count_tokens_estimate(message)
         estimated_output_tokens = min(
@@ -139,7 +228,10 @@ async def handle_ai_query(user_id: str, message: str) -> str:
         )  # Conservative estimate
         estimated_cost = calculate_cost(estimated_input_tokens, estimated_output_tokens)
 
-        if current_balance < estimated_cost:
+        # Reserve the estimated cost up front, so concurrent queries from the
+        # same user cannot all pass the balance check against the same funds
+        if debit_balance(user_id, estimated_cost) is None:
+            current_balance = balances.get(user_id, 0.0)
             return (
                 f"💰 **Insufficient Balance**\n\n"
                 f"Estimated cost: {estimated_cost:.4f} HTR\n"
@@ -149,40 +241,58 @@ async def handle_ai_query(user_id: str, message: str) -> str:
                 f"Type 'top up 1 HTR' to add funds."
             )
 
-        # Process the AI query
-        try:
-            ai_response, input_tokens, output_tokens = await process_ai_query(message)
-        except Exception as e:
-            return f"❌ {str(e)}"
+        # Serve repeated prompts from the response cache
+        cache_key = normalize_prompt(message)
+        embedding = None
+        cached = response_cache.get(cache_key)
+        if cached is None and semantic_cache_enabled():
+            embedding = await embed_prompt(message)
+            if embedding is not None:
+                cached = response_cache.get_similar(embedding)
+
+        if cached is not None:
+            ai_response, input_tokens, output_tokens = cached
+        else:
+            # Process the AI query
+            try:
+                ai_response, input_tokens, output_tokens = await process_ai_query(
+                    message
+                )
+            except Exception as e:
+                # Release the reservation
+                credit_balance(user_id, estimated_cost)
+                return f"❌ {str(e)}"
+
+            response_cache.put(
+                cache_key, (ai_response, input_tokens, output_tokens), embedding
+            )
 
-        # Calculate actual cost
+        # Calculate actual cost (cache hits are charged at a reduced rate)
         actual_cost = calculate_cost(input_tokens, output_tokens)
+        if cached is not None:
+            actual_cost *= AI_CACHE_COST_FACTOR
 
-        # Deduct cost from balance
-        balances[user_id] = current_balance - actual_cost
+        # Settle the reservation against the actual cost
+        new_balance = credit_balance(user_id, estimated_cost - actual_cost)
 
         # Log usage
-        if user_id not in usage_logs:
-            usage_logs[user_id] = []
-
         usage_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": time.time(),
             "type": "ai_query",
             "cost": actual_cost,
             "tokens_used": input_tokens + output_tokens,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
+            "cached": cached is not None,
             "query_preview": message[:50] + "..." if len(message) > 50 else message,
         }
-        usage_logs[user_id].append(usage_entry)
+        record_usage(user_id, usage_entry)
 
         logger.info(f"AI query completed for {user_id}: {actual_cost:.4f} HTR charged")
 
         # Format response with billing info
         response = f"🤖 **AI Response:**\n\n{ai_response}\n\n"
-        response += (
-            f"💰 Cost: {actual_cost:.4f} HTR | Balance: {balances[user_id]:.4f} HTR"
-        )
+        response += f"💰 Cost: {actual_cost:.4f} HTR | Balance: {new_balance:.4f} HTR"
 
         return response
 
@@ -4,8 +4,11 @@ Balance Handler
 Handles balance queries and usage statistics.
 """
 
+import heapq
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from ..state import balances, get_usage_summary, usage_logs
 
 logger = logging.getLogger(__name__)
 
@@ -21,33 +24,20 @@ async def handle_balance_query(user_id: str) -> str:
         Reply message with balance information
     """
     try:
-        # Import here to avoid circular imports
-        from ..app import balances, usage_logs
-
         # Get user's current balance
         current_balance = balances.get(user_id, 0.0)
 
-        # Calculate usage statistics
-        user_usage = usage_logs.get(user_id, [])
-        total_spent = sum(entry.get("cost", 0) for entry in user_usage)
-
-        # Calculate usage in the last 24 hours
-        now = datetime.now()
-        yesterday = now - timedelta(days=1)
-
-        recent_usage = [
-            entry
-            for entry in user_usage
-            if datetime.fromisoformat(entry.get("timestamp", "1970-01-01")) > yesterday
-        ]
-        recent_spent = sum(entry.get("cost", 0) for entry in recent_usage)
-        recent_queries = len(recent_usage)
+        # Get running usage totals, including the last 24 hours
+        usage = get_usage_summary(user_id)
+        total_spent = usage["total_spent"]
+        recent_spent = usage["recent_spent"]
+        recent_queries = usage["recent_queries"]
 
         # Generate balance report
         message = f"💳 **Account Summary**\n\n"
         message += f"💰 Current Balance: **{current_balance:.4f} HTR**\n"
         message += f"📊 Total Spent: {total_spent:.4f} HTR\n"
-        message += f"🔢 Total Queries: {len(user_usage)}\n\n"
+        message += f"🔢 Total Queries: {usage['total_queries']}\n\n"
 
         if recent_queries > 0:
             message += f"📅 **Last 24 Hours:**\n"
@@ -95,9 +85,6 @@ async def handle_usage_history(user_id: str, limit: int = 10) -> str:
         Usage history message
     """
     try:
-        # Import here to avoid circular imports
-        from ..app import usage_logs
-
         user_usage = usage_logs.get(user_id, [])
 
         if not user_usage:
@@ -106,16 +93,14 @@ async def handle_usage_history(user_id: str, limit: int = 10) -> str:
                 "No usage history found. Start using the AI assistant to see your activity here!"
             )
 
-        # Sort by timestamp (most recent first)
-        sorted_usage = sorted(
-            user_usage, key=lambda x: x.get("timestamp", "1970-01-01"), reverse=True
+        # Select the most recent entries without sorting the whole log
+        recent_usage = heapq.nlargest(
+            limit, user_usage, key=lambda x: x.get("timestamp", 0)
         )
 
-        message = (
-            f"📋 **Usage History** (Last {min(limit, len(sorted_usage))} entries)\n\n"
-        )
+        message = f"📋 **Usage History** (Last {len(recent_usage)} entries)\n\n"
 
-        for i, entry in enumerate(sorted_usage[:limit]):
+        for i, entry in enumerate(recent_usage):
             timestamp = entry.get("timestamp", "Unknown")
             cost = entry.get("cost", 0)
             query_type = entry.get("type", "query")
@@ -123,7 +108,7 @@ async def handle_usage_history(user_id: str, limit: int = 10) -> str:
 
             try:
                 # Format timestamp
-                dt = datetime.fromisoformat(timestamp)
+                dt = datetime.fromtimestamp(timestamp)
                 time_str = dt.strftime("%m/%d %H:%M")
             except:
                 time_str = "Unknown"
@@ -8,15 +8,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-
-async def handle_help_request() -> str:
-    """
-    Generate help message with usage instructions.
-
-    Returns:
-        Help message for the user
-    """
-    help_message = """
+# Static reply texts, built once at import
+HELP_MESSAGE = """
 🤖 **WhatsPayAI - Your AI Assistant**
 
 Welcome! I'm an AI assistant powered by Hathor blockchain micro-payments. Here's how to use me:
@@ -54,20 +47,9 @@ Just ask me any question - I'm here to help!
 
 ---
 Powered by Hathor Network | Fast, feeless transactions
-"""
-
-    logger.info("Help request handled")
-    return help_message.strip()
-
+""".strip()
 
-async def handle_getting_started() -> str:
-    """
-    Generate getting started guide for new users.
-
-    Returns:
-        Getting started message
-    """
-    message = """
+GETTING_STARTED_MESSAGE = """
 🎉 **Welcome to WhatsPayAI!**
 
 Let's get you started in 3 easy steps:
@@ -90,19 +72,9 @@ Ask me anything:
 Most questions cost just 0.01-0.05 HTR (less than a penny!)
 
 Ready to begin? Type `top up 1 HTR` to start!
-"""
-
-    return message.strip()
-
-
-async def handle_pricing_info() -> str:
-    """
-    Generate detailed pricing information.
+""".strip()
 
-    Returns:
-        Pricing information message
-    """
-    message = """
+PRICING_MESSAGE = """
 💰 **WhatsPayAI Pricing**
 
 **Simple Token-Based Pricing:**
@@ -132,19 +104,9 @@ async def handle_pricing_info() -> str:
 • Low balance warnings included
 
 Ready to try? Your first question might cost just 0.01 HTR!
-"""
-
-    return message.strip()
-
-
-async def handle_technical_info() -> str:
-    """
-    Generate technical information about the service.
+""".strip()
 
-    Returns:
-        Technical information message
-    """
-    message = """
+TECHNICAL_INFO_MESSAGE = """
 🔧 **Technical Information**
 
 **Powered By:**
@@ -177,19 +139,9 @@ async def handle_technical_info() -> str:
 • Multi-language support
 
 Questions about the technology? Just ask!
-"""
-
-    return message.strip()
-
+""".strip()
 
-def get_command_list() -> str:
-    """
-    Generate list of available commands.
-
-    Returns:
-        Command list message
-    """
-    commands = """
+COMMAND_LIST_MESSAGE = """
 📋 **Available Commands:**
 
 **Balance & Payments:**
@@ -217,6 +169,55 @@ Just ask naturally! No special commands needed.
 • "Summarize this article: [paste text]"
 
 Type any command or question to get started!
-"""
+""".strip()
+
+
+async def handle_help_request() -> str:
+    """
+    Generate help message with usage instructions.
+
+    Returns:
+        Help message for the user
+    """
+    logger.info("Help request handled")
+    return HELP_MESSAGE
 
-    return commands.strip()
+
+async def handle_getting_started() -> str:
+    """
+    Generate getting started guide for new users.
+
+    Returns:
+        Getting started message
+    """
+    return GETTING_STARTED_MESSAGE
+
+
+async def handle_pricing_info() -> str:
+    """
+    Generate detailed pricing information.
+
+    Returns:
+        Pricing information message
+    """
+    return PRICING_MESSAGE
+
+
+async def handle_technical_info() -> str:
+    """
+    Generate technical information about the service.
+
+    Returns:
+        Technical information message
+    """
+    return TECHNICAL_INFO_MESSAGE
+
+
+def get_command_list() -> str:
+    """
+    Generate list of available commands.
+
+    Returns:
+        Command list message
+    """
+    return COMMAND_LIST_MESSAGE
@@ -6,33 +6,40 @@ Handles payment-related requests including top-ups and deposit processing.
 
 import logging
 import re
+from functools import lru_cache
 from typing import Optional
 
+from ..state import balances, queue_deposit
+
 logger = logging.getLogger(__name__)
 
+# Patterns to match amounts like "1 HTR", "0.5 htr", "top up 2.5", etc.
+# Checked in order, so an explicit "X HTR" amount takes priority.
+AMOUNT_PATTERNS = [
+    re.compile(r"(\d+(?:\.\d+)?)\s*htr"),  # "1.5 HTR"
+    re.compile(r"top\s*up\s+(\d+(?:\.\d+)?)"),  # "top up 1.5"
+    re.compile(r"add\s+(\d+(?:\.\d+)?)"),  # "add 1.5"
+    re.compile(r"deposit\s+(\d+(?:\.\d+)?)"),  # "deposit 1.5"
+]
+
 
+@lru_cache(maxsize=4096)
 def extract_amount_from_message(message: str) -> Optional[float]:
     """
     Extract HTR amount from user message.
 
+    Cached, since users tend to repeat the same top-up command verbatim.
+
     Args:
         message: User's message text
 
     Returns:
         Amount in HTR if found, None otherwise
     """
-    # Patterns to match amounts like "1 HTR", "0.5 htr", "top up 2.5", etc.
-    patterns = [
-        r"(\d+(?:\.\d+)?)\s*htr",  # "1.5 HTR"
-        r"top\s*up\s+(\d+(?:\.\d+)?)",  # "top up 1.5"
-        r"add\s+(\d+(?:\.\d+)?)",  # "add 1.5"
-        r"deposit\s+(\d+(?:\.\d+)?)",  # "deposit 1.5"
-    ]
-
     message_lower = message.lower()
 
-    for pattern in patterns:
-        match = re.search(pattern, message_lower)
+    for pattern in AMOUNT_PATTERNS:
+        match = pattern.search(message_lower)
         if match:
             try:
                 amount = float(match.group(1))
@@ -56,8 +63,6 @@ async def handle_payment_request(user_id: str, message: str) -> str:
         Reply message for the user
     """
     try:
-        # Import here to avoid circular imports
-        from ..app import deposit_queue
         from ..hathor_client import get_user_address
 
         # Extract amount from message
@@ -77,12 +82,8 @@ async def handle_payment_request(user_id: str, message: str) -> str:
         # Get or generate user's Hathor address
         user_address = get_user_address(user_id)
 
-        # Add to deposit queue for monitoring
-        deposit_queue[user_address] = {
-            "user_id": user_id,
-            "expected_amount": amount,
-            "timestamp": None,  # Would be set in production
-        }
+        # Add to deposit queue for monitoring (expires after DEPOSIT_TTL_SECONDS)
+        queue_deposit(user_address, user_id, amount)
 
         logger.info(
             f"Added deposit queue entry for user {user_id}, amount {amount} HTR"
@@ -119,9 +120,6 @@ async def handle_deposit_confirmation(user_id: str, tx_hash: str, amount: float)
         Confirmation message
     """
     try:
-        # Import here to avoid circular imports
-        from ..app import balances
-
         current_balance = balances.get(user_id, 0.0)
 
         return (
@@ -8,11 +8,16 @@ Note: Uses HTTP client fallback when hathor-wallet-lib is not available.
 import hashlib
 import logging
 import os
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 
-import requests
+import httpx
+import orjson
 from dotenv import load_dotenv
 
+from .http_client import HTTP2_AVAILABLE, get_http_client
+from .state_store import append_event
+
 # Try to import Hathor libraries, fallback to HTTP client if not available
 try:
     # These packages may not be available on PyPI
@@ -36,6 +41,24 @@ HATHOR_NETWORK = os.getenv("HATHOR_NETWORK", "testnet")
 HATHOR_NODE_URL = os.getenv("HATHOR_NODE_URL", "https://node1.testnet.hathor.network")
 HATHOR_WALLET_SEED = os.getenv("HATHOR_WALLET_SEED")
 
+# Real-time websocket endpoint of the node, used for address subscriptions
+HATHOR_WS_URL = os.getenv(
+    "HATHOR_WS_URL",
+    HATHOR_NODE_URL.rstrip("/").replace("http", "ws", 1) + "/v1a/ws/",
+)
+
+# Address prefix and hash length for the configured network, resolved once
+ADDRESS_PREFIX, ADDRESS_HASH_LENGTH = (
+    ("WYBwT", 30) if HATHOR_NETWORK == "testnet" else ("H", 33)
+)
+
+# Connection pool and request limits for the Hathor node
+HATHOR_POOL_SIZE = 32
+HATHOR_TIMEOUT = httpx.Timeout(10, connect=3.05)
+
+# Shared stand-in for outputs without decoded data
+_NO_DECODED: Dict[str, str] = {}
+
 # In-memory storage for user addresses
 user_addresses: Dict[str, str] = {}  # user_id -> address
 
@@ -45,9 +68,23 @@ class HathorClient:
 
     def __init__(self, node_url: str = HATHOR_NODE_URL):
         self.node_url = node_url.rstrip("/")
-        self.session = requests.Session()
-        self.session.headers.update(
-            {"Content-Type": "application/json", "User-Agent": "WhatsPayAI/1.0"}
+        self.headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "WhatsPayAI/1.0",
+            # Address histories compress well; both clients decode transparently
+            "Accept-Encoding": "gzip, deflate",
+        }
+
+        # Requests to the node multiplex over one connection when HTTP/2 is
+        # available; failed polls are simply retried on the next tick
+        self.client = httpx.Client(
+            headers=self.headers,
+            timeout=HATHOR_TIMEOUT,
+            limits=httpx.Limits(
+                max_keepalive_connections=HATHOR_POOL_SIZE,
+                max_connections=HATHOR_POOL_SIZE,
+            ),
+            http2=HTTP2_AVAILABLE,
         )
 
     def _make_request(
@@ -58,16 +95,47 @@ class HathorClient:
             url = f"{self.node_url}/{endpoint.lstrip('/')}"
 
             if method.upper() == "GET":
-                response = self.session.get(url, params=data)
+                response = self.client.get(url, params=data)
+            elif method.upper() == "POST":
+                response = self.client.post(url, json=data)
+            else:
+                raise ValueError(f"Unsupported HTTP method: {method}")
+
+            response.raise_for_status()
+            return orjson.loads(response.content)
+
+        except httpx.HTTPError as e:
+            logger.error(f"Hathor API request failed: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error in Hathor request: {e}")
+            return None
+
+    async def _make_request_async(
+        self, endpoint: str, method: str = "GET", data: dict = None
+    ) -> Optional[dict]:
+        """Make HTTP request to Hathor node on the shared async client."""
+        try:
+            url = f"{self.node_url}/{endpoint.lstrip('/')}"
+
+            if method.upper() == "GET":
+                response = await get_http_client().get(
+                    url,
+                    params=data,
+                    headers=self.headers,
+                    timeout=HATHOR_TIMEOUT,
+                )
             elif method.upper() == "POST":
-                response = self.session.post(url, json=data)
+                response = await get_http_client().post(
+                    url, json=data, headers=self.headers, timeout=HATHOR_TIMEOUT
+                )
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Hathor API request failed: {e}")
             return None
         except Exception as e:
@@ -86,11 +154,29 @@ class HathorClient:
             f"thin_wallet/address_history", "GET", {"address": address}
         )
 
+    async def get_address_history_async(self, address: str) -> Optional[dict]:
+        """Get transaction history for an address without blocking."""
+        return await self._make_request_async(
+            "thin_wallet/address_history", "GET", {"address": address}
+        )
+
 
 # Global Hathor client instance
 hathor_client = HathorClient()
 
 
+@lru_cache(maxsize=1)
+def _seed_prefix_hash(seed: str):
+    """
+    SHA-256 state with the "<seed>:" prefix already absorbed.
+
+    Copying this state means each address only hashes the user_id bytes.
+    hashlib's sha256 is backed by OpenSSL, which uses the CPU's SHA
+    extensions where available.
+    """
+    return hashlib.sha256(f"{seed}:".encode())
+
+
 def generate_deterministic_address(user_id: str) -> str:
     """
     Generate a deterministic Hathor address for a user.
@@ -113,16 +199,16 @@ def generate_deterministic_address(user_id: str) -> str:
             raise ValueError("HATHOR_WALLET_SEED not configured")
 
         # Simple deterministic address generation (simplified for demo)
-        combined_seed = f"{HATHOR_WALLET_SEED}:{user_id}"
-        address_hash = hashlib.sha256(combined_seed.encode()).hexdigest()
+        # Equivalent to sha256(f"{HATHOR_WALLET_SEED}:{user_id}")
+        digest = _seed_prefix_hash(HATHOR_WALLET_SEED).copy()
+        digest.update(user_id.encode())
+        address_hash = digest.hexdigest()
 
         # Generate mock Hathor address format (in production, use proper derivation)
-        if HATHOR_NETWORK == "testnet":
-            address = f"WYBwT{address_hash[:30]}"  # Testnet prefix
-        else:
-            address = f"H{address_hash[:33]}"  # Mainnet prefix
+        address = f"{ADDRESS_PREFIX}{address_hash[:ADDRESS_HASH_LENGTH]}"
 
         user_addresses[user_id] = address
+        append_event("address", {"user_id": user_id, "address": address})
         logger.info(f"Generated address {address} for user {user_id}")
 
         return address
@@ -143,12 +229,31 @@ def get_user_address(user_id: str) -> str:
     Returns:
         Hathor address string
     """
-    if user_id in user_addresses:
-        return user_addresses[user_id]
+    # user_addresses memoizes derived addresses; one lookup on the hot path
+    address = user_addresses.get(user_id)
+    if address is not None:
+        return address
 
     return generate_deterministic_address(user_id)
 
 
+def _parse_deposits(history: Optional[dict], address: str) -> List[Tuple[str, float]]:
+    """Extract (transaction_hash, amount) pairs paid to an address."""
+    if not history or not history.get("success"):
+        logger.warning(f"Failed to get history for address {address}")
+        return []
+
+    # Single pass over all outputs; the value is checked in centis and only
+    # converted to HTR for outputs that are actually kept
+    return [
+        (tx.get("tx_id"), value / 100)
+        for tx in history.get("history", [])
+        for output in tx.get("outputs", [])
+        if (output.get("decoded") or _NO_DECODED).get("address") == address
+        and (value := output.get("value", 0)) > 0
+    ]
+
+
 def check_incoming_deposits(address: str) -> List[Tuple[str, float]]:
     """
     Check for new incoming deposits to an address.
@@ -162,22 +267,26 @@ def check_incoming_deposits(address: str) -> List[Tuple[str, float]]:
     try:
         # Get address history
         history = hathor_client.get_address_history(address)
-        if not history or not history.get("success"):
-            logger.warning(f"Failed to get history for address {address}")
-            return []
+        return _parse_deposits(history, address)
 
-        deposits = []
-        transactions = history.get("history", [])
+    except Exception as e:
+        logger.error(f"Error checking deposits for address {address}: {e}")
+        return []
+
+
+async def check_incoming_deposits_async(address: str) -> List[Tuple[str, float]]:
+    """
+    Check for new incoming deposits to an address without blocking.
 
-        for tx in transactions:
-            # Check if this is an incoming transaction
-            for output in tx.get("outputs", []):
-                if output.get("decoded", {}).get("address") == address:
-                    amount = output.get("value", 0) / 100  # Convert from centis to HTR
-                    if amount > 0:
-                        deposits.append((tx.get("tx_id"), amount))
+    Args:
+        address: Hathor address to check
 
-        return deposits
+    Returns:
+        List of (transaction_hash, amount) tuples
+    """
+    try:
+        history = await hathor_client.get_address_history_async(address)
+        return _parse_deposits(history, address)
 
     except Exception as e:
         logger.error(f"Error checking deposits for address {address}: {e}")
@@ -250,8 +359,11 @@ def validate_hathor_address(address: str) -> bool:
     if not address or not isinstance(address, str):
         return False
 
-    # Basic validation for Hathor address format
-    if HATHOR_NETWORK == "testnet":
-        return address.startswith("WYBwT") and len(address) >= 30
-    else:
-        return address.startswith("H") and len(address) >= 30
+    return _is_valid_address(address, ADDRESS_PREFIX)
+
+
+@lru_cache(maxsize=4096)
+def _is_valid_address(address: str, prefix: str) -> bool:
+    # Basic validation for Hathor address format; keyed on the prefix so a
+    # network change never reuses results for the other network
+    return address.startswith(prefix) and len(address) >= 30
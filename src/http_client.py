@@ -0,0 +1,71 @@
+"""
+Shared HTTP Client
+
+A single pooled async HTTP client for outbound OpenAI and Twilio calls, so
+TCP and TLS connections are reused across requests.
+"""
+
+import importlib.util
+import logging
+import os
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Shared client and the OpenAI client bound to it. Both are created on first
+# use inside the running event loop and again after close_http_client, so a
+# later lifespan in the same process (reload, test app) gets a live pool.
+_http_client: Optional[httpx.AsyncClient] = None
+_openai_client: Optional[AsyncOpenAI] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if it is missing or closed."""
+    global _http_client, _openai_client
+
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            http2=HTTP2_AVAILABLE,
+        )
+        # An OpenAI client bound to the previous pool can no longer send
+        _openai_client = None
+
+    return _http_client
+
+
+def get_openai_client() -> Optional[AsyncOpenAI]:
+    """
+    Return the async OpenAI client on the shared connection pool.
+
+    Returns:
+        AsyncOpenAI client, or None if OPENAI_API_KEY is not configured
+    """
+    global _openai_client
+
+    http_client = get_http_client()
+    if _openai_client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        _openai_client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+    return _openai_client
+
+
+async def close_http_client():
+    """Close pooled connections held by the shared client."""
+    global _http_client, _openai_client
+
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        _openai_client = None
+        logger.info("Shared HTTP client closed")
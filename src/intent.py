@@ -5,13 +5,20 @@ Classifies incoming WhatsApp messages into specific intents using OpenAI API
 with fallback to keyword-based classification.
 """
 
+import asyncio
+import hashlib
 import logging
 import os
 import re
-from typing import Optional
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 
 import openai
+import orjson
 from dotenv import load_dotenv
+from openai import OpenAI
+
+from .http_client import get_openai_client
 
 # Load environment variables
 load_dotenv()
@@ -19,6 +26,12 @@ load_dotenv()
 # Configure OpenAI client
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Sync client for callers outside the event loop; batched async
+# classification uses get_openai_client() on the shared connection pool
+openai_sync_client = None
+if openai.api_key:
+    openai_sync_client = OpenAI(api_key=openai.api_key)
+
 logger = logging.getLogger(__name__)
 
 # Intent definitions
@@ -61,6 +74,63 @@ HELP_KEYWORDS = [
     r"\bguide\b",
 ]
 
+# Keyword intents, highest priority first
+KEYWORD_INTENTS = [
+    ("payment_intent", PAYMENT_KEYWORDS),
+    ("balance_intent", BALANCE_KEYWORDS),
+    ("help_intent", HELP_KEYWORDS),
+]
+INTENT_PRIORITY = {intent: rank for rank, (intent, _) in enumerate(KEYWORD_INTENTS)}
+
+# Every keyword pattern starts with a word boundary and a literal letter;
+# checking that letter first rejects most word starts before trying any
+# alternative, which is the common case for messages without keywords
+KEYWORD_FIRST_LETTERS = "".join(
+    sorted({pattern[2] for _, patterns in KEYWORD_INTENTS for pattern in patterns})
+)
+
+# All keywords in one case-insensitive pattern with a named group per intent,
+# so each message is scanned once regardless of how many keywords exist
+KEYWORD_PATTERN = re.compile(
+    rf"\b(?=[{KEYWORD_FIRST_LETTERS}])(?:"
+    + "|".join(
+        f"(?P<{intent}>{'|'.join(pattern[2:] for pattern in patterns)})"
+        for intent, patterns in KEYWORD_INTENTS
+    )
+    + ")",
+    re.IGNORECASE,
+)
+
+# Unambiguous one-word commands, classified without calling OpenAI
+FAST_PATH_INTENTS = {
+    "help": "help_intent",
+    "hi": "help_intent",
+    "start": "help_intent",
+    "balance": "balance_intent",
+    "top up": "payment_intent",
+    "topup": "payment_intent",
+    "deposit": "payment_intent",
+}
+
+# Number of distinct normalized messages whose intent is remembered
+INTENT_CACHE_SIZE = 2048
+
+# Batched OpenAI classification: up to INTENT_BATCH_SIZE messages per request,
+# waiting at most INTENT_BATCH_WAIT seconds to fill a batch
+INTENT_BATCH_SIZE = 16
+INTENT_BATCH_WAIT = 0.05
+
+# Digest of normalized message -> intent, most recently used last. Keys are
+# fixed-size digests so long messages don't inflate the cache.
+_intent_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+# Messages waiting for batched classification, and the task that drains them
+_pending: Optional[asyncio.Queue] = None
+_batcher_task: Optional[asyncio.Task] = None
+
+# Numbered lines in a batched classification reply, e.g. "2. balance_intent"
+BATCH_REPLY_PATTERN = re.compile(r"^\s*(\d+)\s*[.):-]\s*([a-z_]+)", re.MULTILINE)
+
 
 def classify_with_openai(message: str) -> Optional[str]:
     """
@@ -89,7 +159,10 @@ def classify_with_openai(message: str) -> Optional[str]:
         If the message doesn't clearly fit any category, return "ai_query_intent".
         """
 
-        response = openai.ChatCompletion.create(
+        if openai_sync_client is None:
+            raise Exception("OpenAI API client not initialized")
+
+        response = openai_sync_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {
@@ -127,31 +200,18 @@ def classify_with_keywords(message: str) -> str:
     Returns:
         Classified intent (defaults to ai_query_intent)
     """
-    message_lower = message.lower()
-
-    # Check for payment intent
-    for pattern in PAYMENT_KEYWORDS:
-        if re.search(pattern, message_lower):
-            logger.info(
-                f"Keyword-based classification: payment_intent (matched: {pattern})"
-            )
-            return "payment_intent"
-
-    # Check for balance intent
-    for pattern in BALANCE_KEYWORDS:
-        if re.search(pattern, message_lower):
-            logger.info(
-                f"Keyword-based classification: balance_intent (matched: {pattern})"
-            )
-            return "balance_intent"
-
-    # Check for help intent
-    for pattern in HELP_KEYWORDS:
-        if re.search(pattern, message_lower):
-            logger.info(
-                f"Keyword-based classification: help_intent (matched: {pattern})"
-            )
-            return "help_intent"
+    # Keep the highest-priority intent matched anywhere in the message
+    best = None
+    for match in KEYWORD_PATTERN.finditer(message):
+        if best is None or INTENT_PRIORITY[match.lastgroup] < INTENT_PRIORITY[best[0]]:
+            best = (match.lastgroup, match.group(0))
+            if INTENT_PRIORITY[best[0]] == 0:
+                break
+
+    if best is not None:
+        intent, keyword = best
+        logger.info(f"Keyword-based classification: {intent} (matched: {keyword})")
+        return intent
 
     # Default to AI query
     logger.info("Keyword-based classification: ai_query_intent (default)")
@@ -162,7 +222,9 @@ def classify_intent(message: str) -> str:
     """
     Main intent classification function.
 
-    First tries OpenAI API, falls back to keyword matching if that fails.
+    Common commands like "balance" or "help" are answered locally. Other
+    messages try the OpenAI API first and fall back to keyword matching if
+    that fails; OpenAI results are cached by normalized message.
 
     Args:
         message: The user's message text
@@ -173,10 +235,229 @@ def classify_intent(message: str) -> str:
     if not message or not message.strip():
         return "help_intent"
 
+    normalized = message.strip().lower()
+    cached = FAST_PATH_INTENTS.get(normalized) or _get_cached_intent(normalized)
+    if cached:
+        return cached
+
     # Try OpenAI classification first
-    openai_intent = classify_with_openai(message)
+    openai_intent = classify_with_openai(normalized)
     if openai_intent:
+        _cache_intent(normalized, openai_intent)
         return openai_intent
 
     # Fallback to keyword-based classification
-    return classify_with_keywords(message)
+    return classify_with_keywords(normalized)
+
+
+async def classify_intent_async(message: str) -> str:
+    """
+    Classify a message without blocking the event loop.
+
+    Concurrent callers are batched into a single OpenAI request; keyword
+    matching is used if the batch request fails.
+
+    Args:
+        message: The user's message text
+
+    Returns:
+        Classified intent string
+    """
+    if not message or not message.strip():
+        return "help_intent"
+
+    normalized = message.strip().lower()
+    cached = FAST_PATH_INTENTS.get(normalized) or _get_cached_intent(normalized)
+    if cached:
+        return cached
+
+    if get_openai_client() is not None:
+        future = asyncio.get_running_loop().create_future()
+        _get_pending_queue().put_nowait((normalized, future))
+
+        openai_intent = await future
+        if openai_intent:
+            _cache_intent(normalized, openai_intent)
+            return openai_intent
+
+    return classify_with_keywords(normalized)
+
+
+async def classify_batch_with_openai(messages: List[str]) -> List[Optional[str]]:
+    """
+    Classify several messages with one OpenAI request.
+
+    The reply is streamed and the connection closed as soon as every
+    message has an intent, so no tokens past the last line are awaited.
+
+    Args:
+        messages: Message texts to classify
+
+    Returns:
+        Intent for each message, or None where classification failed
+    """
+    results: List[Optional[str]] = [None] * len(messages)
+
+    try:
+        intent_list = "\n".join(
+            [f"- {intent}: {desc}" for intent, desc in INTENTS.items()]
+        )
+        # Each message is a JSON string, so newlines or quotes in user text
+        # can't forge numbered lines for other users' messages
+        numbered = "\n".join(
+            f"{i}. {orjson.dumps(message).decode()}"
+            for i, message in enumerate(messages, 1)
+        )
+
+        prompt = (
+            "Classify each of the following WhatsApp messages into one of these "
+            f"intents:\n\n{intent_list}\n\nMessages:\n{numbered}\n\n"
+            "Reply with one line per message in the form '<number>. <intent_name>'. "
+            "If a message doesn't clearly fit any category, use ai_query_intent."
+        )
+
+        stream = await get_openai_client().chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an intent classifier for a WhatsApp AI assistant.",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=10 * len(messages),
+            temperature=0,
+            stream=True,
+        )
+
+        reply = ""
+        remaining = len(messages)
+        async for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+
+            reply += chunk.choices[0].delta.content.lower()
+
+            # Parse only complete lines; the last one may still be streaming
+            lines, _, reply = reply.rpartition("\n")
+            remaining -= _parse_batch_reply(lines, results)
+            if remaining <= 0:
+                await stream.response.aclose()
+                break
+        else:
+            _parse_batch_reply(reply, results)
+
+        logger.info(f"OpenAI classified {len(messages)} messages in one request")
+
+    except Exception as e:
+        logger.error(f"OpenAI batch intent classification failed: {e}")
+
+    return results
+
+
+def _parse_batch_reply(text: str, results: List[Optional[str]]) -> int:
+    """Fill results from numbered reply lines, returning how many were new."""
+    found = 0
+    for number, intent in BATCH_REPLY_PATTERN.findall(text):
+        index = int(number) - 1
+        if 0 <= index < len(results) and intent in INTENTS and results[index] is None:
+            results[index] = intent
+            found += 1
+    return found
+
+
+async def _run_batcher(queue: asyncio.Queue):
+    """Collect queued messages into batches and classify each batch."""
+    loop = asyncio.get_running_loop()
+    batch: List[Tuple[str, asyncio.Future]] = []
+
+    try:
+        while True:
+            batch = [await queue.get()]
+
+            # Fill the batch until it is full or the wait window closes
+            deadline = loop.time() + INTENT_BATCH_WAIT
+            while len(batch) < INTENT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            intents = await classify_batch_with_openai(
+                [message for message, _ in batch]
+            )
+            for (_, future), intent in zip(batch, intents):
+                if not future.done():
+                    future.set_result(intent)
+    except asyncio.CancelledError:
+        _release_waiters(batch)
+        raise
+
+
+def _release_waiters(items: List[Tuple[str, asyncio.Future]]):
+    """Resolve unanswered callers with no intent, so they use keywords."""
+    for _, future in items:
+        if not future.done():
+            future.set_result(None)
+
+
+def _get_pending_queue() -> asyncio.Queue:
+    """Get the batch queue, starting the batcher on the current event loop."""
+    global _pending, _batcher_task
+
+    loop = asyncio.get_running_loop()
+    if (
+        _batcher_task is None
+        or _batcher_task.done()
+        or _batcher_task.get_loop() is not loop
+    ):
+        _pending = asyncio.Queue()
+        _batcher_task = loop.create_task(_run_batcher(_pending))
+
+    return _pending
+
+
+def stop_intent_batcher():
+    """
+    Cancel the background batcher task.
+
+    Callers still waiting on a queued or in-flight batch are released and
+    fall back to keyword classification instead of hanging.
+    """
+    global _pending, _batcher_task
+
+    if _batcher_task is not None:
+        _batcher_task.cancel()
+    if _pending is not None:
+        while not _pending.empty():
+            _release_waiters([_pending.get_nowait()])
+    _pending = None
+    _batcher_task = None
+
+
+def _intent_cache_key(message: str) -> bytes:
+    return hashlib.blake2b(message.encode(), digest_size=16).digest()
+
+
+def _get_cached_intent(message: str) -> Optional[str]:
+    key = _intent_cache_key(message)
+    intent = _intent_cache.get(key)
+    if intent is not None:
+        _intent_cache.move_to_end(key)
+    return intent
+
+
+def _cache_intent(message: str, intent: str):
+    key = _intent_cache_key(message)
+    _intent_cache[key] = intent
+    _intent_cache.move_to_end(key)
+    if len(_intent_cache) > INTENT_CACHE_SIZE:
+        _intent_cache.popitem(last=False)
+
+
+def clear_intent_cache():
+    """Forget all cached intent classifications."""
+    _intent_cache.clear()
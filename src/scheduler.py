@@ -4,77 +4,136 @@ APScheduler Job Scheduler
 Manages background tasks for processing deposits and saving state.
 """
 
+import asyncio
 import logging
-from typing import Dict
+import os
+from typing import Dict, Iterable, Optional, Set
 
-from apscheduler.schedulers.background import BackgroundScheduler
+import orjson
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from .hathor_client import HATHOR_WS_URL, check_incoming_deposits_async
+from .state import credit_balance, deposit_queue, expire_deposits, save_state
+from .state_store import append_event
+from .twilio_client import send_whatsapp_message_safe
+
+# websockets is optional; without it deposits are found by polling alone
+try:
+    import websockets
+
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
 # Global scheduler instance
 scheduler = None
 
+# Task listening for pushed address updates from the node
+_ws_task: Optional[asyncio.Task] = None
+
+# Current interval of the deposit poll job
+_poll_seconds: Optional[int] = None
+
+# Deposit runs from the poll and from pushed updates must not overlap, or the
+# same transaction could be credited twice
+_deposit_lock: Optional[asyncio.Lock] = None
+
+# Interval between full state snapshots (changes are logged as they happen)
+STATE_SNAPSHOT_MINUTES = int(os.getenv("STATE_SNAPSHOT_MINUTES", "5"))
+
+# Maximum concurrent Hathor node requests per deposit check
+DEPOSIT_CHECK_CONCURRENCY = 32
+
+# Poll interval for pending deposits. Once the node confirms a websocket
+# subscription the poll only reconciles updates that were missed, so it runs
+# far less often; it returns to the normal interval if the connection drops.
+DEPOSIT_POLL_SECONDS = 30
+DEPOSIT_RECONCILE_SECONDS = int(os.getenv("DEPOSIT_RECONCILE_SECONDS", "300"))
+
+# Seconds between checks for newly queued addresses to subscribe, and the
+# longest wait before reconnecting a dropped websocket
+WS_SUBSCRIBE_INTERVAL = 1.0
+WS_MAX_BACKOFF = 60.0
 
-def process_deposits():
+
+async def process_deposits(addresses: Optional[Iterable[str]] = None):
     """
     Background job to process pending deposits.
 
-    Checks all addresses in the deposit queue for new incoming transactions
-    and credits user balances accordingly.
+    Checks addresses in the deposit queue for new incoming transactions
+    and credits user balances accordingly. Runs on the application's event
+    loop, with all node requests in flight concurrently.
+
+    Args:
+        addresses: Only check these queued addresses (default: all of them)
     """
+    global _deposit_lock
+
+    if _deposit_lock is None:
+        _deposit_lock = asyncio.Lock()
+
+    async with _deposit_lock:
+        await _process_deposits(addresses)
+
+
+async def _process_deposits(addresses: Optional[Iterable[str]]):
     try:
-        # Import here to avoid circular imports
-        from .app import balances, deposit_queue
-        from .hathor_client import check_incoming_deposits
+        # Drop deposits nobody paid within the TTL
+        for address in expire_deposits():
+            logger.info(f"Expired pending deposit for address {address}")
 
         if not deposit_queue:
             return
 
-        processed_addresses = []
-
-        for address, user_info in deposit_queue.items():
+        # Snapshot the queue; webhooks may queue deposits while checks run
+        if addresses is None:
+            candidates = list(deposit_queue.items())
+        else:
+            candidates = [
+                (address, deposit_queue[address])
+                for address in set(addresses)
+                if address in deposit_queue
+            ]
+
+        pending = []
+        for address, user_info in candidates:
             user_id = user_info.get("user_id")
-            expected_amount = user_info.get("expected_amount", 0)
-
             if not user_id:
                 logger.warning(f"Invalid user_info for address {address}")
                 continue
+            pending.append((address, user_id))
+
+        if not pending:
+            return
+
+        # Check all addresses concurrently
+        semaphore = asyncio.Semaphore(DEPOSIT_CHECK_CONCURRENCY)
 
-            # Check for new deposits
-            deposits = check_incoming_deposits(address)
+        async def check(address: str):
+            async with semaphore:
+                return await check_incoming_deposits_async(address)
 
+        results = await asyncio.gather(*(check(address) for address, _ in pending))
+
+        processed_addresses = []
+        notifications = []
+
+        for (address, user_id), deposits in zip(pending, results):
             for tx_hash, amount in deposits:
                 # Credit user balance
-                if user_id not in balances:
-                    balances[user_id] = 0.0
-
-                balances[user_id] += amount
+                new_balance = credit_balance(user_id, amount)
 
                 logger.info(
                     f"Credited {amount} HTR to user {user_id} from tx {tx_hash}"
                 )
 
-                # Send notification to user (import here to avoid circular imports)
-                try:
-                    import asyncio
-
-                    from .twilio_client import send_whatsapp_message_safe
-
-                    message = (
-                        f"✅ Deposit confirmed! {amount} HTR has been added to your account. "
-                        f"Current balance: {balances[user_id]} HTR"
-                    )
-
-                    # Run async function in sync context
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    loop.run_until_complete(
-                        send_whatsapp_message_safe(user_id, message)
-                    )
-                    loop.close()
-
-                except Exception as e:
-                    logger.error(f"Failed to send deposit notification: {e}")
+                message = (
+                    f"✅ Deposit confirmed! {amount} HTR has been added to your account. "
+                    f"Current balance: {new_balance} HTR"
+                )
+                notifications.append(send_whatsapp_message_safe(user_id, message))
 
             # If we found deposits, mark address as processed
             if deposits:
@@ -82,21 +141,135 @@ def process_deposits():
 
         # Remove processed addresses from queue
         for address in processed_addresses:
-            del deposit_queue[address]
+            if deposit_queue.pop(address, None) is None:
+                continue
+            append_event("deposit_processed", {"address": address})
             logger.info(f"Removed processed address {address} from deposit queue")
 
+        # Send all notifications for this tick concurrently
+        for result in await asyncio.gather(*notifications, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to send deposit notification: {result}")
+
     except Exception as e:
         logger.error(f"Error in process_deposits job: {e}")
 
 
+def _decode_ws_message(raw) -> Optional[dict]:
+    """Decode a pushed node message, or None if it isn't a JSON object."""
+    try:
+        message = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+
+    return message if isinstance(message, dict) else None
+
+
+def _addresses_in_ws_message(message: dict) -> Set[str]:
+    """Extract the addresses a pushed node message refers to."""
+    addresses = set()
+    if message.get("address"):
+        addresses.add(message["address"])
+
+    # Transaction payloads list the addresses they pay in their outputs
+    tx = message.get("history")
+    if not isinstance(tx, dict):
+        tx = message
+    for output in tx.get("outputs") or ():
+        address = (output.get("decoded") or {}).get("address")
+        if address:
+            addresses.add(address)
+
+    return addresses
+
+
+def _set_deposit_poll_interval(seconds: int):
+    """Reschedule the deposit poll job if its interval changes."""
+    global _poll_seconds
+
+    if scheduler is None or seconds == _poll_seconds:
+        return
+
+    scheduler.reschedule_job("process_deposits", trigger="interval", seconds=seconds)
+    _poll_seconds = seconds
+    logger.info(f"Polling for deposits every {seconds}s")
+
+
+async def _sync_subscriptions(ws, subscribed: Set[str]):
+    """
+    Match the node subscriptions to the deposit queue.
+
+    Newly queued addresses are subscribed, and addresses that were processed
+    or expired are unsubscribed and forgotten.
+    """
+    queued = deposit_queue.keys()
+
+    for address in queued - subscribed:
+        await ws.send(orjson.dumps({"type": "subscribe_address", "address": address}))
+        subscribed.add(address)
+
+    for address in subscribed - queued:
+        await ws.send(orjson.dumps({"type": "unsubscribe_address", "address": address}))
+        subscribed.discard(address)
+
+
+async def _ws_listener():
+    """
+    Subscribe to pending deposit addresses on the node's websocket.
+
+    Subscriptions follow the deposit queue, and a pushed update for a queued
+    address triggers a deposit check for it alone. The poll slows to the
+    reconcile interval once the node confirms a subscription, and speeds up
+    again while disconnected. Reconnects with exponential backoff if the
+    connection drops.
+    """
+    backoff = 1.0
+
+    while True:
+        try:
+            async with websockets.connect(HATHOR_WS_URL) as ws:
+                logger.info(f"Connected to Hathor node updates at {HATHOR_WS_URL}")
+                backoff = 1.0
+                subscribed: Set[str] = set()
+
+                while True:
+                    await _sync_subscriptions(ws, subscribed)
+
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), WS_SUBSCRIBE_INTERVAL)
+                    except asyncio.TimeoutError:
+                        continue
+
+                    message = _decode_ws_message(raw)
+                    if message is None:
+                        continue
+
+                    if message.get("type") == "subscribe_address":
+                        if message.get("success"):
+                            _set_deposit_poll_interval(DEPOSIT_RECONCILE_SECONDS)
+                        continue
+
+                    updated = _addresses_in_ws_message(message) & deposit_queue.keys()
+                    if updated:
+                        await process_deposits(updated)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Hathor websocket error, reconnecting in {backoff}s: {e}")
+            _set_deposit_poll_interval(DEPOSIT_POLL_SECONDS)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, WS_MAX_BACKOFF)
+
+
 def save_state_job():
     """
-    Background job to periodically save application state to disk.
+    Background job to periodically snapshot application state to disk.
+
+    Writing the snapshot compacts the change log, keeping startup replay short.
+    Plain functions run on the scheduler's thread pool, off the event loop.
     """
     try:
-        # Import here to avoid circular imports
-        from .app import save_state
-
         save_state()
 
     except Exception as e:
@@ -106,37 +279,46 @@ def save_state_job():
 def start_scheduler():
     """
     Initialize and start the background scheduler.
+
+    Must be called from the running application event loop.
     """
-    global scheduler
+    global scheduler, _ws_task, _poll_seconds
 
     if scheduler is not None:
         logger.warning("Scheduler already running")
         return
 
     try:
-        scheduler = BackgroundScheduler()
+        scheduler = AsyncIOScheduler()
 
-        # Add deposit processing job (every 30 seconds)
+        # Add deposit processing job; the websocket listener slows it down once
+        # pushed updates are confirmed
+        _poll_seconds = DEPOSIT_POLL_SECONDS
         scheduler.add_job(
             process_deposits,
             "interval",
-            seconds=30,
+            seconds=_poll_seconds,
             id="process_deposits",
             name="Process Hathor Deposits",
         )
 
-        # Add state saving job (every 60 seconds)
+        # Add state snapshot job (every STATE_SNAPSHOT_MINUTES minutes)
         scheduler.add_job(
             save_state_job,
             "interval",
-            seconds=60,
+            minutes=STATE_SNAPSHOT_MINUTES,
             id="save_state",
-            name="Save Application State",
+            name="Snapshot Application State",
         )
 
         scheduler.start()
         logger.info("Background scheduler started successfully")
 
+        if WEBSOCKETS_AVAILABLE:
+            _ws_task = asyncio.get_running_loop().create_task(_ws_listener())
+        else:
+            logger.info("websockets not available, polling for deposits only")
+
     except Exception as e:
         logger.error(f"Failed to start scheduler: {e}")
 
@@ -145,7 +327,11 @@ def stop_scheduler():
     """
     Stop the background scheduler.
     """
-    global scheduler
+    global scheduler, _ws_task
+
+    if _ws_task is not None:
+        _ws_task.cancel()
+        _ws_task = None
 
     if scheduler is not None:
         try:
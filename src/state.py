@@ -0,0 +1,327 @@
+"""
+Application State
+
+In-memory user state shared by the web app, message handlers and scheduler,
+together with the helpers that keep it consistent and persisted.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .hathor_client import user_addresses
+from .state_store import (
+    STATE_FILE,
+    STATE_LOG_FILE,
+    append_event,
+    load_snapshot,
+    log_lock,
+    open_log,
+    queue_event,
+    replay_log,
+    write_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+# Global state - In-memory dictionaries for fast access
+balances: Dict[str, float] = {}  # user_id -> HTR balance
+usage_logs: Dict[str, List[Dict]] = {}  # user_id -> list of usage entries
+deposit_queue: Dict[str, Dict] = {}  # address -> user_info
+
+# Running usage totals derived from usage_logs (rebuilt on startup, not persisted)
+usage_stats: Dict[str, Dict] = {}  # user_id -> totals and recent (ts, cost) window
+
+# Aggregate counters served by /stats, kept current by the balance and usage
+# helpers so scrapes are O(1)
+stats_totals: Dict[str, float] = {"total_balance": 0.0, "total_queries": 0}
+
+# Window for "recent" usage statistics, in seconds
+RECENT_USAGE_WINDOW = 24 * 60 * 60
+
+# Pending deposits expire after this many seconds
+DEPOSIT_TTL_SECONDS = int(os.getenv("DEPOSIT_TTL_SECONDS", "3600"))
+
+# (expires_at, address) in expiry order; the TTL is fixed, so appending keeps
+# it sorted. Entries left stale by re-queued or processed deposits are skipped.
+deposit_expiry: deque = deque()
+
+# Serializes balance updates from request handlers and the scheduler thread
+_balance_lock = threading.Lock()
+
+
+def load_state():
+    """
+    Load application state on startup.
+
+    Reads the last snapshot, replays the change log on top of it and opens
+    the log for appending.
+    """
+    try:
+        state = load_snapshot()
+        last_seq = 0
+        if state is not None:
+            # Update in place; other modules hold references to these dicts
+            balances.update(_intern_keys(state.get("balances", {})))
+            usage_logs.update(_intern_keys(state.get("usage_logs", {})))
+            deposit_queue.update(state.get("deposit_queue", {}))
+            user_addresses.update(_intern_keys(state.get("user_addresses", {})))
+            last_seq = state.get("last_seq", 0)
+            logger.info(f"Loaded state from {STATE_FILE}")
+        else:
+            logger.info("No state file found, starting with empty state")
+
+        replayed = replay_log(
+            {
+                "balances": balances,
+                "usage_logs": usage_logs,
+                "deposit_queue": deposit_queue,
+                "user_addresses": user_addresses,
+            },
+            after_seq=last_seq,
+        )
+        if replayed:
+            logger.info(f"Replayed {replayed} events from {STATE_LOG_FILE}")
+
+        rebuild_usage_stats()
+        rebuild_deposit_expiry()
+        rebuild_stats_totals()
+    except Exception as e:
+        logger.error(f"Error loading state: {e}")
+
+    open_log()
+
+
+def _intern_keys(mapping: Dict[str, object]) -> Dict[str, object]:
+    """Intern user_id keys so the per-user dicts share one string per user."""
+    return {sys.intern(key): value for key, value in mapping.items()}
+
+
+def debit_balance(user_id: str, amount: float) -> Optional[float]:
+    """
+    Atomically deduct an amount if the user's balance covers it.
+
+    Args:
+        user_id: User's WhatsApp number
+        amount: Amount in HTR to deduct
+
+    Returns:
+        New balance, or None if the balance is insufficient
+    """
+    with _balance_lock:
+        current_balance = balances.get(user_id, 0.0)
+        if current_balance < amount:
+            return None
+
+        new_balance = balances[user_id] = current_balance - amount
+        stats_totals["total_balance"] -= amount
+        append_event("balance", {"user_id": user_id, "balance": new_balance})
+
+    return new_balance
+
+
+def credit_balance(user_id: str, amount: float) -> float:
+    """
+    Atomically add an amount (which may be negative) to a user's balance.
+
+    Args:
+        user_id: User's WhatsApp number
+        amount: Amount in HTR to add
+
+    Returns:
+        New balance
+    """
+    with _balance_lock:
+        new_balance = balances[user_id] = balances.get(user_id, 0.0) + amount
+        stats_totals["total_balance"] += amount
+        append_event("balance", {"user_id": user_id, "balance": new_balance})
+
+    return new_balance
+
+
+def _add_usage_stats(user_id: str, entry: Dict):
+    """Fold a usage entry into the user's running totals."""
+    stats = usage_stats.get(user_id)
+    if stats is None:
+        stats = usage_stats[user_id] = {
+            "total_spent": 0.0,
+            "total_queries": 0,
+            "recent": deque(),
+            "recent_spent": 0.0,
+        }
+
+    cost = entry.get("cost", 0)
+    timestamp = entry.get("timestamp", 0)
+    stats["total_spent"] += cost
+    stats["total_queries"] += 1
+
+    if timestamp > time.time() - RECENT_USAGE_WINDOW:
+        stats["recent"].append((timestamp, cost))
+        stats["recent_spent"] += cost
+
+
+def record_usage(user_id: str, entry: Dict):
+    """
+    Append a usage entry and update the user's running totals.
+
+    The usage event is buffered and written to the state log by the
+    background flusher, so queries never wait on disk I/O.
+
+    Args:
+        user_id: User's WhatsApp number
+        entry: Usage entry with epoch "timestamp" and "cost"
+    """
+    with log_lock:
+        usage_logs.setdefault(user_id, []).append(entry)
+        queue_event("usage", {"user_id": user_id, "entry": entry})
+
+    _add_usage_stats(user_id, entry)
+    stats_totals["total_queries"] += 1
+
+
+def get_usage_summary(user_id: str) -> Dict:
+    """
+    Get a user's usage totals without scanning their usage log.
+
+    Args:
+        user_id: User's WhatsApp number
+
+    Returns:
+        Dictionary with total_spent, total_queries, recent_spent, recent_queries
+    """
+    stats = usage_stats.get(user_id)
+    if stats is None:
+        return {
+            "total_spent": 0.0,
+            "total_queries": 0,
+            "recent_spent": 0.0,
+            "recent_queries": 0,
+        }
+
+    # Drop entries that have aged out of the recent window
+    recent = stats["recent"]
+    cutoff = time.time() - RECENT_USAGE_WINDOW
+    while recent and recent[0][0] <= cutoff:
+        stats["recent_spent"] -= recent.popleft()[1]
+
+    return {
+        "total_spent": stats["total_spent"],
+        "total_queries": stats["total_queries"],
+        "recent_spent": stats["recent_spent"] if recent else 0.0,
+        "recent_queries": len(recent),
+    }
+
+
+def rebuild_usage_stats():
+    """Recompute running usage totals from the loaded usage logs."""
+    usage_stats.clear()
+
+    for user_id, entries in usage_logs.items():
+        for entry in entries:
+            # Older state files stored ISO-8601 timestamps
+            timestamp = entry.get("timestamp")
+            if isinstance(timestamp, str):
+                try:
+                    entry["timestamp"] = datetime.fromisoformat(timestamp).timestamp()
+                except ValueError:
+                    entry["timestamp"] = 0.0
+
+            _add_usage_stats(user_id, entry)
+
+
+def rebuild_stats_totals():
+    """Recompute the /stats counters from the loaded state."""
+    stats_totals["total_balance"] = sum(balances.values())
+    stats_totals["total_queries"] = sum(len(logs) for logs in usage_logs.values())
+
+
+def queue_deposit(address: str, user_id: str, expected_amount: float) -> Dict:
+    """
+    Add or refresh a pending deposit for an address.
+
+    Args:
+        address: Hathor address to monitor
+        user_id: User's WhatsApp number
+        expected_amount: Amount in HTR the user intends to deposit
+
+    Returns:
+        The deposit queue entry
+    """
+    now = time.time()
+    info = {
+        "user_id": user_id,
+        "expected_amount": expected_amount,
+        "timestamp": now,
+        "expires_at": now + DEPOSIT_TTL_SECONDS,
+    }
+
+    deposit_queue[address] = info
+    deposit_expiry.append((info["expires_at"], address))
+    append_event("deposit_queued", {"address": address, "info": info})
+
+    return info
+
+
+def expire_deposits(now: Optional[float] = None) -> List[str]:
+    """
+    Remove pending deposits whose TTL has passed.
+
+    Only expired entries are visited, not the whole queue.
+
+    Args:
+        now: Current epoch time (defaults to time.time())
+
+    Returns:
+        Addresses that were removed
+    """
+    if now is None:
+        now = time.time()
+
+    expired = []
+    while deposit_expiry and deposit_expiry[0][0] <= now:
+        expires_at, address = deposit_expiry.popleft()
+        info = deposit_queue.get(address)
+        if info is None or info.get("expires_at") != expires_at:
+            continue
+
+        del deposit_queue[address]
+        append_event("deposit_expired", {"address": address})
+        expired.append(address)
+
+    return expired
+
+
+def rebuild_deposit_expiry():
+    """Recompute the deposit expiry index from the loaded deposit queue."""
+    deposit_expiry.clear()
+
+    now = time.time()
+    for info in deposit_queue.values():
+        # Older state files have no expiry; give those entries a full TTL
+        if not info.get("expires_at"):
+            info["timestamp"] = info.get("timestamp") or now
+            info["expires_at"] = now + DEPOSIT_TTL_SECONDS
+
+    deposit_expiry.extend(
+        sorted((info["expires_at"], address) for address, info in deposit_queue.items())
+    )
+
+
+def save_state():
+    """Write a full state snapshot to JSON file and compact the change log."""
+    try:
+        state = {
+            "balances": balances,
+            "usage_logs": usage_logs,
+            "deposit_queue": deposit_queue,
+            "user_addresses": user_addresses,
+        }
+        write_snapshot(state)
+        logger.info(f"Saved state to {STATE_FILE}")
+    except Exception as e:
+        logger.error(f"Error saving state: {e}")
@@ -0,0 +1,364 @@
+"""
+State Store
+
+Write-ahead log persistence for application state. Every state change is
+appended as a single JSON line to the log; a periodic snapshot rewrites the
+full state file and starts a fresh log. Events are numbered, and the snapshot
+records the last number it includes, so replay never applies an event twice.
+"""
+
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# State file paths
+STATE_FILE = os.getenv("STATE_FILE", "state.json")
+STATE_LOG_FILE = os.getenv("STATE_LOG_FILE", "state.log")
+
+# Batched log writes: buffered events are flushed every STATE_FLUSH_MS, or as
+# soon as STATE_FLUSH_BATCH events are pending
+STATE_FLUSH_BATCH = int(os.getenv("STATE_FLUSH_BATCH", "100"))
+STATE_FLUSH_MS = int(os.getenv("STATE_FLUSH_MS", "200"))
+
+# Log file handle, opened once at startup
+_log_file = None
+
+# Encoded events waiting for the next batched flush
+_pending: List[bytes] = []
+
+# Whether log writes have happened since the last fsync
+_unsynced = False
+
+# Sequence number of the last event written or replayed. Snapshots record it,
+# so events already reflected in a snapshot are skipped on replay.
+_seq = 0
+
+# Guards the log file and pending buffer. Hold it while mutating state whose
+# event is queued, so a snapshot never captures one without the other.
+log_lock = threading.RLock()
+
+# Serializes snapshot writers; event appends only wait for the segment swap
+_snapshot_lock = threading.Lock()
+
+
+def open_log(path: str = STATE_LOG_FILE):
+    """Open the write-ahead log for appending."""
+    global _log_file
+
+    with log_lock:
+        if _log_file is None:
+            _log_file = open(path, "ab")
+            logger.info(f"Opened state log {path}")
+
+
+def close_log():
+    """Flush and close the write-ahead log."""
+    global _log_file
+
+    with log_lock:
+        if _log_file is not None:
+            _write_pending()
+            _log_file.close()
+            _log_file = None
+
+
+def append_event(kind: str, payload: Dict[str, Any]):
+    """
+    Append a state change event to the write-ahead log.
+
+    The write is flushed to the OS immediately and fsynced with the next
+    batched flush.
+
+    Args:
+        kind: Event type (balance, usage, address, deposit_queued,
+            deposit_processed, deposit_expired)
+        payload: Event data
+    """
+    global _unsynced
+
+    with log_lock:
+        if _log_file is None:
+            logger.debug(f"State log not open, dropping {kind} event")
+            return
+
+        try:
+            _log_file.write(_encode_event(kind, payload))
+            _log_file.flush()
+            _unsynced = True
+        except Exception as e:
+            logger.error(f"Error appending {kind} event to state log: {e}")
+
+
+def queue_event(kind: str, payload: Dict[str, Any]):
+    """
+    Buffer a state change event for the next batched log write.
+
+    Args:
+        kind: Event type (see append_event)
+        payload: Event data
+    """
+    with log_lock:
+        if _log_file is None:
+            logger.debug(f"State log not open, dropping {kind} event")
+            return
+
+        _pending.append(_encode_event(kind, payload))
+        if len(_pending) >= STATE_FLUSH_BATCH:
+            _write_pending()
+
+
+def _encode_event(kind: str, payload: Dict[str, Any]) -> bytes:
+    # Caller must hold log_lock
+    global _seq
+
+    _seq += 1
+    return orjson.dumps(
+        {"seq": _seq, "kind": kind, "data": payload},
+        option=orjson.OPT_APPEND_NEWLINE,
+    )
+
+
+def flush_events() -> int:
+    """
+    Write all buffered events to the log in a single write and fsync it.
+
+    Returns:
+        Number of events flushed
+    """
+    global _unsynced
+
+    with log_lock:
+        if _log_file is None:
+            return 0
+
+        count = _write_pending()
+        if not _unsynced:
+            return count
+
+        # A duplicate descriptor stays valid if a snapshot rotates and closes
+        # the log before the fsync below completes
+        fd = os.dup(_log_file.fileno())
+        _unsynced = False
+
+    # One fsync covers every event written since the last flush. It runs
+    # without the lock, so appends never wait on disk latency.
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Retry with the next flush
+        with log_lock:
+            _unsynced = True
+        raise
+    finally:
+        os.close(fd)
+
+    return count
+
+
+def _write_pending() -> int:
+    # Caller must hold log_lock
+    global _unsynced
+
+    count = len(_pending)
+    if not count:
+        return 0
+
+    try:
+        _log_file.write(b"".join(_pending))
+        _log_file.flush()
+        _unsynced = True
+    except Exception as e:
+        logger.error(f"Error flushing {count} events to state log: {e}")
+    _pending.clear()
+
+    return count
+
+
+def apply_event(state: Dict[str, dict], kind: str, payload: Dict[str, Any]):
+    """
+    Apply a logged event to the in-memory state.
+
+    Args:
+        state: Dictionary with balances, usage_logs and deposit_queue
+        kind: Event type
+        payload: Event data
+    """
+    if kind == "balance":
+        state["balances"][payload["user_id"]] = payload["balance"]
+    elif kind == "usage":
+        state["usage_logs"].setdefault(payload["user_id"], []).append(payload["entry"])
+    elif kind == "address":
+        state.setdefault("user_addresses", {})[payload["user_id"]] = payload["address"]
+    elif kind == "deposit_queued":
+        state["deposit_queue"][payload["address"]] = payload["info"]
+    elif kind in ("deposit_processed", "deposit_expired"):
+        state["deposit_queue"].pop(payload["address"], None)
+    else:
+        logger.warning(f"Unknown state event kind: {kind}")
+
+
+def load_snapshot(path: str = STATE_FILE) -> Optional[Dict[str, dict]]:
+    """
+    Load the last state snapshot.
+
+    Returns:
+        Snapshot dictionary, or None if no snapshot exists
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def replay_log(
+    state: Dict[str, dict], path: str = STATE_LOG_FILE, after_seq: int = 0
+) -> int:
+    """
+    Replay logged events on top of a loaded snapshot.
+
+    A log segment left behind by an interrupted snapshot (<path>.old) is
+    replayed first. Events numbered at or below after_seq are already part of
+    the snapshot and skipped, so replaying a log the snapshot has absorbed is
+    harmless. New events are numbered after the highest sequence seen.
+
+    Args:
+        state: Dictionary with balances, usage_logs and deposit_queue
+        path: Log file path
+        after_seq: Sequence number recorded in the snapshot
+
+    Returns:
+        Number of events replayed
+    """
+    global _seq
+
+    replayed = 0
+    last_seq = after_seq
+    for segment in (_old_segment_path(path), path):
+        if not os.path.exists(segment):
+            continue
+
+        with open(segment, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    event = orjson.loads(line)
+                    # Events written before sequencing carry no number
+                    seq = event.get("seq")
+                    if seq is not None:
+                        last_seq = max(last_seq, seq)
+                        if seq <= after_seq:
+                            continue
+
+                    apply_event(state, event["kind"], event["data"])
+                    replayed += 1
+                except Exception as e:
+                    # A torn final line is expected after a crash mid-write
+                    logger.warning(f"Skipping unreadable state log entry: {e}")
+
+    with log_lock:
+        _seq = max(_seq, last_seq)
+
+    return replayed
+
+
+def _old_segment_path(log_path: str) -> str:
+    """Path the log is rotated to while a snapshot is being written."""
+    return f"{log_path}.old"
+
+
+def _rotate_log(log_path: str, old_path: str):
+    # Caller must hold log_lock with the log file closed
+    if not os.path.exists(log_path):
+        return
+
+    if not os.path.exists(old_path):
+        os.replace(log_path, old_path)
+        return
+
+    # An earlier snapshot did not complete; its segment still holds events
+    # the last durable snapshot lacks, so keep them ahead of the current log.
+    # The leading newline ends a possibly torn final line.
+    with open(log_path, "rb") as src, open(old_path, "ab") as dst:
+        dst.write(b"\n")
+        shutil.copyfileobj(src, dst)
+    os.remove(log_path)
+
+
+def _copy_state(state: Dict[str, dict]) -> Dict[str, dict]:
+    """
+    Copy each state table, and the lists in it, for serializing off the lock.
+
+    Values are otherwise shared: stored entries are replaced, never mutated.
+    """
+    return {
+        name: {
+            key: list(value) if isinstance(value, list) else value
+            for key, value in table.items()
+        }
+        for name, table in state.items()
+    }
+
+
+def write_snapshot(
+    state: Dict[str, dict], path: str = STATE_FILE, log_path: str = STATE_LOG_FILE
+):
+    """
+    Write a full state snapshot and compact the write-ahead log.
+
+    Only the log segment swap happens under the log lock: the current log is
+    rotated to <log_path>.old and the state is copied. Serializing, fsync and
+    the os.replace of the snapshot then run without the lock, while new
+    events go to a fresh log. The old segment is deleted once the snapshot is
+    durable; until then replay_log still reads it.
+
+    The snapshot is written to a temporary file and swapped in with
+    os.replace, so a crash mid-write never leaves a partial state file.
+
+    Args:
+        state: Dictionary with balances, usage_logs, deposit_queue and
+            user_addresses
+        path: Snapshot file path
+        log_path: Log file path
+    """
+    global _log_file, _unsynced
+
+    old_path = _old_segment_path(log_path)
+
+    with _snapshot_lock:
+        with log_lock:
+            reopen = _log_file is not None
+            if reopen:
+                # Buffered events belong to the segment being retired
+                _write_pending()
+                _log_file.close()
+            try:
+                _rotate_log(log_path, old_path)
+            finally:
+                if reopen:
+                    _log_file = open(log_path, "ab")
+                    _unsynced = False
+
+            snapshot = _copy_state(state)
+            snapshot["last_seq"] = _seq
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(snapshot, option=orjson.OPT_INDENT_2))
+            # The snapshot must be durable before the old segment is deleted
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        # Every event in the old segment is now part of the snapshot
+        if os.path.exists(old_path):
+            os.remove(old_path)
@@ -6,10 +6,13 @@ Handles sending WhatsApp messages via Twilio REST API.
 
 import logging
 import os
+import re
+from functools import lru_cache
 from typing import Optional
 
 from dotenv import load_dotenv
-from twilio.rest import Client
+
+from .http_client import get_http_client
 
 # Load environment variables
 load_dotenv()
@@ -21,17 +24,24 @@ TWILIO_SID = os.getenv("TWILIO_SID")
 TWILIO_TOKEN = os.getenv("TWILIO_TOKEN")
 TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
 
-# Initialize Twilio client
-twilio_client = None
+# Twilio Messages endpoint, posted to with the shared HTTP client
+TWILIO_API_URL = "https://api.twilio.com/2010-04-01"
+
+twilio_messages_url = None
 if TWILIO_SID and TWILIO_TOKEN:
-    try:
-        twilio_client = Client(TWILIO_SID, TWILIO_TOKEN)
-        logger.info("Twilio client initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Twilio client: {e}")
+    twilio_messages_url = f"{TWILIO_API_URL}/Accounts/{TWILIO_SID}/Messages.json"
+    logger.info("Twilio client initialized successfully")
 else:
     logger.warning("Twilio credentials not found in environment variables")
 
+# Optional "whatsapp:" prefix, then "+" and ASCII digits only (str.isdigit
+# also accepts other scripts); the number itself is captured
+PHONE_NUMBER_PATTERN = re.compile(r"(?:whatsapp:)?(\+[0-9]+)")
+
+# Longer messages are truncated (WhatsApp limit is ~4096 characters)
+MAX_MESSAGE_LENGTH = 4000
+TRUNCATION_SUFFIX = "..."
+
 
 async def send_whatsapp_message(to_number: str, message: str) -> bool:
     """
@@ -44,7 +54,7 @@ async def send_whatsapp_message(to_number: str, message: str) -> bool:
     Returns:
         True if message sent successfully, False otherwise
     """
-    if not twilio_client:
+    if not twilio_messages_url:
         logger.error("Twilio client not initialized")
         return False
 
@@ -58,11 +68,14 @@ async def send_whatsapp_message(to_number: str, message: str) -> bool:
             to_number = f"whatsapp:{to_number}"
 
         # Send message via Twilio
-        message_instance = twilio_client.messages.create(
-            body=message, from_=TWILIO_WHATSAPP_NUMBER, to=to_number
+        response = await get_http_client().post(
+            twilio_messages_url,
+            auth=(TWILIO_SID, TWILIO_TOKEN),
+            data={"Body": message, "From": TWILIO_WHATSAPP_NUMBER, "To": to_number},
         )
+        response.raise_for_status()
 
-        logger.info(f"Message sent successfully. SID: {message_instance.sid}")
+        logger.info(f"Message sent successfully. SID: {response.json()['sid']}")
         return True
 
     except Exception as e:
@@ -80,19 +93,21 @@ def validate_phone_number(phone_number: str) -> Optional[str]:
     Returns:
         Normalized phone number or None if invalid
     """
-    if not phone_number:
+    if not phone_number or not isinstance(phone_number, str):
         return None
 
-    # Remove whatsapp: prefix if present
-    if phone_number.startswith("whatsapp:"):
-        phone_number = phone_number[9:]
+    normalized = _normalize_phone_number(phone_number)
+    if normalized is None:
+        logger.warning(f"Invalid phone number format: {phone_number}")
+
+    return normalized
 
-    # Basic validation - should start with + and contain only digits
-    if phone_number.startswith("+") and phone_number[1:].isdigit():
-        return phone_number
 
-    logger.warning(f"Invalid phone number format: {phone_number}")
-    return None
+@lru_cache(maxsize=4096)
+def _normalize_phone_number(phone_number: str) -> Optional[str]:
+    # Strip any whatsapp: prefix and check the number in one match
+    match = PHONE_NUMBER_PATTERN.fullmatch(phone_number)
+    return match.group(1) if match else None
 
 
 async def send_whatsapp_message_safe(to_number: str, message: str) -> bool:
@@ -117,9 +132,10 @@ async def send_whatsapp_message_safe(to_number: str, message: str) -> bool:
         logger.error("Empty message content")
         return False
 
-    # Truncate message if too long (WhatsApp limit is ~4096 characters)
-    if len(message) > 4000:
-        message = message[:3997] + "..."
+    # Truncate message if too long
+    if len(message) > MAX_MESSAGE_LENGTH:
+        keep = MAX_MESSAGE_LENGTH - len(TRUNCATION_SUFFIX)
+        message = message[:keep] + TRUNCATION_SUFFIX
         logger.warning("Message truncated due to length limit")
 
     return await send_whatsapp_message(validated_number, message)
@@ -4,13 +4,24 @@ Test Configuration and Fixtures
 Common test utilities and fixtures for WhatsPayAI tests.
 """
 
+import asyncio
 import json
 import os
 import tempfile
-from unittest.mock import AsyncMock, Mock
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
+# uvloop is optional (and unavailable on Windows); tests fall back to asyncio
+try:
+    import uvloop
+
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
 # Load test environment
 os.environ.setdefault("TWILIO_SID", "test_sid")
 os.environ.setdefault("TWILIO_TOKEN", "test_token")
@@ -21,23 +32,66 @@ os.environ.setdefault("HATHOR_NODE_URL", "https://node1.testnet.hathor.network")
 os.environ.setdefault("HATHOR_WALLET_SEED", "test_seed_phrase")
 os.environ.setdefault("DEBUG", "true")
 
+# Import the application once, after the test environment is set and before
+# collection; this loads every handler and client module
+from src.ai_cache import response_cache  # noqa: E402
+from src.app import create_app  # noqa: E402
+from src.handlers.ai_query import count_tokens_estimate  # noqa: E402
+from src.handlers.payment import extract_amount_from_message  # noqa: E402
+from src.hathor_client import (  # noqa: E402
+    _is_valid_address,
+    user_addresses,
+    validate_hathor_address,
+)
+from src.intent import clear_intent_cache  # noqa: E402
+from src.state import (  # noqa: E402
+    balances,
+    deposit_expiry,
+    deposit_queue,
+    rebuild_stats_totals,
+    usage_logs,
+    usage_stats,
+)
+from src.twilio_client import (  # noqa: E402
+    _normalize_phone_number,
+    validate_phone_number,
+)
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """One event loop shared by all async tests, on uvloop when available."""
+    loop = uvloop.new_event_loop() if UVLOOP_AVAILABLE else asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The FastAPI app, built once; clear_app_state resets state, not routes."""
+    return create_app()
+
+
+@pytest.fixture(scope="session")
+def openai_chat_response():
+    """Build OpenAI-style chat completion responses with the given content."""
+
+    def build(content: str = "This is a mock AI response.") -> SimpleNamespace:
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))]
+        )
 
-@pytest.fixture
-def mock_openai():
-    """Mock OpenAI API responses."""
-    mock_response = Mock()
-    mock_response.choices = [Mock(message=Mock(content="This is a mock AI response."))]
-    return mock_response
+    return build
 
 
-@pytest.fixture
-def mock_twilio_client():
-    """Mock Twilio client."""
-    mock_client = Mock()
-    mock_message = Mock()
-    mock_message.sid = "mock_message_sid"
-    mock_client.messages.create.return_value = mock_message
-    return mock_client
+@pytest.fixture(scope="session")
+def twilio_message_response():
+    """Build Twilio Messages API responses for the given message SID."""
+
+    def build(sid: str = "mock_message_sid") -> SimpleNamespace:
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {"sid": sid})
+
+    return build
 
 
 @pytest.fixture
@@ -73,25 +127,68 @@ def temp_state_file():
         os.unlink(temp_file)
 
 
+# Canonical test users: (phone, address, seed_balance)
+TEST_USERS = {
+    "user_a": ("+1234567890", "WYBwT1234567890abcdef1234567890", 1.0),
+    "user_b": ("+1234567891", "WYBwTabcdef1234567890abcdef123456", 0.0),
+}
+
+
+@pytest.fixture(scope="session")
+def test_users():
+    """Canonical test users, validated once per session."""
+    for phone, address, _ in TEST_USERS.values():
+        assert validate_phone_number(phone) == phone
+        assert validate_hathor_address(address)
+
+    return TEST_USERS
+
+
+# Fixed clock for tests that depend on the recent-usage window
+FROZEN_NOW = datetime(2024, 1, 1).timestamp()
+
+
+@pytest.fixture
+def frozen_time():
+    """Freeze the state module's clock at FROZEN_NOW."""
+    with patch("src.state.time") as mock_time:
+        mock_time.time.return_value = FROZEN_NOW
+        yield FROZEN_NOW
+
+
 @pytest.fixture
 def sample_webhook_data():
     """Sample Twilio webhook data."""
     return {"From": "whatsapp:+1234567890", "Body": "Hello, test message"}
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
 def clear_app_state():
-    """Clear application state before each test."""
-    # Import here to avoid circular imports during test collection
-    from src.app import balances, deposit_queue, usage_logs
-
-    balances.clear()
-    usage_logs.clear()
-    deposit_queue.clear()
-
+    """
+    Clear application state and memoization caches before and after each test.
+
+    The shared dicts are cleared in place, since handlers hold references
+    to them from import time.
+    """
+
+    def clear():
+        for state in (
+            balances,
+            usage_logs,
+            usage_stats,
+            deposit_queue,
+            deposit_expiry,
+            user_addresses,
+            response_cache,
+        ):
+            state.clear()
+        rebuild_stats_totals()
+        clear_intent_cache()
+        count_tokens_estimate.cache_clear()
+        extract_amount_from_message.cache_clear()
+        _is_valid_address.cache_clear()
+        _normalize_phone_number.cache_clear()
+
+    clear()
     yield
-
-    # Clean up after test
-    balances.clear()
-    usage_logs.clear()
-    deposit_queue.clear()
+    clear()
@@ -0,0 +1,75 @@
+"""
+Tests for AI Response Cache Module
+"""
+
+import pytest
+
+from src.ai_cache import ResponseCache, normalize_prompt
+
+
+class TestResponseCache:
+    """Test cases for the AI response cache."""
+
+    def test_normalize_prompt(self):
+        """Test prompt normalization for exact-match lookups."""
+        assert normalize_prompt("  What is   the Capital\nof France? ") == (
+            "what is the capital of france?"
+        )
+
+    def test_get_and_put(self):
+        """Test exact-match lookups."""
+        cache = ResponseCache(max_size=4)
+        cache.put("hello", ("Hi there!", 1, 2))
+
+        assert cache.get("hello") == ("Hi there!", 1, 2)
+        assert cache.get("goodbye") is None
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        cache = ResponseCache(max_size=2)
+        cache.put("a", ("A", 1, 1))
+        cache.put("b", ("B", 1, 1))
+
+        # Touch "a" so "b" becomes least recently used
+        cache.get("a")
+        cache.put("c", ("C", 1, 1))
+
+        assert len(cache) == 2
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_clear(self):
+        """Test clearing the cache."""
+        cache = ResponseCache(max_size=2)
+        cache.put("a", ("A", 1, 1))
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.get("a") is None
+
+    def test_get_similar(self):
+        """Test semantic lookups by embedding similarity."""
+        pytest.importorskip("numpy")
+
+        cache = ResponseCache(max_size=4, similarity=0.95)
+        cache.put("capital of france", ("Paris", 5, 1), embedding=[1.0, 0.0, 0.0])
+        cache.put("capital of spain", ("Madrid", 5, 1), embedding=[0.0, 1.0, 0.0])
+
+        assert cache.get_similar([0.99, 0.05, 0.0]) == ("Paris", 5, 1)
+        assert cache.get_similar([0.6, 0.6, 0.5]) is None
+
+    def test_get_similar_after_eviction(self):
+        """Test that evicted prompts no longer match semantically."""
+        pytest.importorskip("numpy")
+
+        cache = ResponseCache(max_size=1, similarity=0.95)
+        cache.put("capital of france", ("Paris", 5, 1), embedding=[1.0, 0.0])
+        cache.put("capital of spain", ("Madrid", 5, 1), embedding=[0.0, 1.0])
+
+        assert cache.get_similar([1.0, 0.0]) is None
+        assert cache.get_similar([0.0, 1.0]) == ("Madrid", 5, 1)
+
+    def test_get_similar_empty(self):
+        """Test semantic lookup on an empty cache."""
+        assert ResponseCache().get_similar([1.0, 0.0]) is None
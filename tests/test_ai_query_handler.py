@@ -2,45 +2,121 @@
 Tests for AI Query Handler Module
 """
 
-from unittest.mock import Mock, patch
+import asyncio
+import re
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
 from src.handlers.ai_query import calculate_cost, count_tokens_estimate, handle_ai_query
 
+# Shared test inputs, built once at import
+HUNDRED_A = "A" * 100
+LONG_MESSAGE = "A" * 2001  # Exceeds MAX_INPUT_LENGTH
+
+# Reply sections in the order the handler formats them
+AI_RESPONSE_PATTERN = re.compile(
+    r"AI Response:.*Paris is the capital of France\..*Cost:.*Balance:", re.S
+)
+
+
+async def stream_chunks(*contents):
+    """Yield OpenAI-style streaming chunks for the given content pieces."""
+    for content in contents:
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=content))]
+        )
+
 
 class TestAIQueryHandler:
     """Test cases for AI query handler."""
 
-    def test_count_tokens_estimate(self):
-        """Test token counting estimation."""
-        test_cases = [
-            ("Hello world", 2),  # ~11 chars / 4 = 2 tokens (floored)
-            ("This is a test", 3),  # ~15 chars / 4 = 3 tokens
+    @pytest.mark.parametrize(
+        "text,expected_tokens",
+        [
+            ("Hello world", 2),  # 11 chars / 4 = 2 tokens (floored)
+            ("This is a test", 3),  # 14 chars / 4 = 3 tokens
             ("", 1),  # Minimum 1 token
-            ("A" * 100, 25),  # 100 chars / 4 = 25 tokens
-        ]
+            (HUNDRED_A, 25),  # 100 chars / 4 = 25 tokens
+        ],
+    )
+    @patch("src.handlers.ai_query._ENCODER", None)
+    def test_count_tokens_estimate(self, text, expected_tokens):
+        """Test token counting estimation."""
+        count_tokens_estimate.cache_clear()
+        assert count_tokens_estimate(text) == expected_tokens
+
+    def test_count_tokens_with_encoder(self):
+        """Test token counting with a tiktoken encoder."""
+        mock_encoder = Mock()
+        mock_encoder.encode.return_value = [9906, 1917]
+
+        with patch("src.handlers.ai_query._ENCODER", mock_encoder):
+            count_tokens_estimate.cache_clear()
+            assert count_tokens_estimate("Hello world") == 2
+            assert count_tokens_estimate("Hello world") == 2
+
+        # Repeated text is served from the cache
+        mock_encoder.encode.assert_called_once_with("Hello world")
+        count_tokens_estimate.cache_clear()
+
+    def test_load_encoder(self, monkeypatch):
+        """Test that loading the encoder drops counts made with the estimate."""
+        import src.handlers.ai_query as ai_query
+
+        mock_encoder = Mock()
+        mock_encoder.encode.return_value = [1, 2, 3, 4, 5]
+        monkeypatch.setattr(ai_query, "_ENCODER", None)
+        monkeypatch.setattr(ai_query, "TIKTOKEN_AVAILABLE", True)
+        monkeypatch.setattr(
+            ai_query,
+            "tiktoken",
+            Mock(encoding_for_model=Mock(return_value=mock_encoder)),
+            raising=False,
+        )
 
-        for text, expected_tokens in test_cases:
-            result = count_tokens_estimate(text)
-            assert result == expected_tokens
+        assert count_tokens_estimate("Hello world") == 2
+        ai_query.load_encoder()
 
-    def test_calculate_cost(self):
-        """Test cost calculation."""
-        test_cases = [
+        assert ai_query._ENCODER is mock_encoder
+        assert count_tokens_estimate("Hello world") == 5
+
+    def test_load_encoder_failure(self, monkeypatch):
+        """Test that a failed download keeps the character estimate."""
+        import src.handlers.ai_query as ai_query
+
+        monkeypatch.setattr(ai_query, "_ENCODER", None)
+        monkeypatch.setattr(ai_query, "TIKTOKEN_AVAILABLE", True)
+        monkeypatch.setattr(
+            ai_query,
+            "tiktoken",
+            Mock(encoding_for_model=Mock(side_effect=OSError("offline"))),
+            raising=False,
+        )
+
+        ai_query.load_encoder()
+
+        assert ai_query._ENCODER is None
+        assert count_tokens_estimate("Hello world") == 2
+
+    @pytest.mark.parametrize(
+        "input_tokens,output_tokens,expected_cost",
+        [
             (50, 50, 0.01),  # 100 total tokens = 0.01 HTR
             (100, 100, 0.02),  # 200 total tokens = 0.02 HTR
             (25, 25, 0.005),  # 50 total tokens = 0.005 HTR
-        ]
-
-        for input_tokens, output_tokens, expected_cost in test_cases:
-            result = calculate_cost(input_tokens, output_tokens)
-            assert result == expected_cost
+        ],
+    )
+    def test_calculate_cost(self, input_tokens, output_tokens, expected_cost):
+        """Test cost calculation."""
+        result = calculate_cost(input_tokens, output_tokens)
+        assert result == expected_cost
 
     @pytest.mark.asyncio
     async def test_handle_ai_query_insufficient_balance(self, clear_app_state):
         """Test AI query with insufficient balance."""
-        from src.app import balances
+        from src.state import balances
 
         balances["+1234567890"] = 0.001  # Very low balance
 
@@ -52,9 +128,7 @@ class TestAIQueryHandler:
     @pytest.mark.asyncio
     async def test_handle_ai_query_message_too_long(self, clear_app_state):
         """Test AI query with message that's too long."""
-        long_message = "A" * 2001  # Exceeds MAX_INPUT_LENGTH
-
-        result = await handle_ai_query("+1234567890", long_message)
+        result = await handle_ai_query("+1234567890", LONG_MESSAGE)
 
         assert "too long" in result
         assert "2000 characters" in result
@@ -63,7 +137,7 @@ class TestAIQueryHandler:
     @patch("src.handlers.ai_query.process_ai_query")
     async def test_handle_ai_query_success(self, mock_process, clear_app_state):
         """Test successful AI query processing."""
-        from src.app import balances, usage_logs
+        from src.state import balances, usage_logs
 
         # Set up sufficient balance
         balances["+1234567890"] = 1.0
@@ -73,10 +147,7 @@ class TestAIQueryHandler:
 
         result = await handle_ai_query("+1234567890", "What is the capital of France?")
 
-        assert "AI Response:" in result
-        assert "Paris is the capital of France." in result
-        assert "Cost:" in result
-        assert "Balance:" in result
+        assert AI_RESPONSE_PATTERN.search(result)
 
         # Check that balance was deducted
         assert balances["+1234567890"] < 1.0
@@ -86,30 +157,59 @@ class TestAIQueryHandler:
         assert len(usage_logs["+1234567890"]) == 1
 
     @pytest.mark.asyncio
-    @patch("src.handlers.ai_query.openai.ChatCompletion.create")
-    async def test_process_ai_query_success(self, mock_create):
+    @patch("src.handlers.ai_query.process_ai_query")
+    async def test_handle_ai_query_cache_hit(self, mock_process, clear_app_state):
+        """Test that repeated prompts are served from the response cache."""
+        from src.state import balances, usage_logs
+
+        balances["+1234567890"] = 1.0
+        mock_process.return_value = ("Paris is the capital of France.", 20, 15)
+
+        await handle_ai_query("+1234567890", "What is the capital of France?")
+        balance_after_first = balances["+1234567890"]
+
+        result = await handle_ai_query("+1234567890", "what is the capital of  France?")
+
+        assert "Paris is the capital of France." in result
+        mock_process.assert_called_once()
+
+        # Cache hits are charged less than a full query
+        first_cost = 1.0 - balance_after_first
+        second_cost = balance_after_first - balances["+1234567890"]
+        assert 0 < second_cost < first_cost
+        assert usage_logs["+1234567890"][1]["cached"] is True
+
+    @pytest.mark.asyncio
+    @patch("src.handlers.ai_query.get_openai_client")
+    async def test_process_ai_query_success(self, mock_get_client):
         """Test successful AI query processing."""
         from src.handlers.ai_query import process_ai_query
 
-        # Mock OpenAI response
-        mock_response = Mock()
-        mock_response.choices = [Mock(message=Mock(content="This is a test response."))]
-        mock_create.return_value = mock_response
+        mock_client = mock_get_client.return_value
+        # Mock streamed OpenAI response
+        mock_create = AsyncMock(
+            return_value=stream_chunks("This is a ", None, "test response.")
+        )
+        mock_client.chat.completions.create = mock_create
 
         response, input_tokens, output_tokens = await process_ai_query("Test question")
 
         assert response == "This is a test response."
         assert input_tokens > 0
         assert output_tokens > 0
-        mock_create.assert_called_once()
+        mock_create.assert_awaited_once()
+        assert mock_create.call_args.kwargs["stream"] is True
 
     @pytest.mark.asyncio
-    @patch("src.handlers.ai_query.openai.ChatCompletion.create")
-    async def test_process_ai_query_openai_error(self, mock_create):
+    @patch("src.handlers.ai_query.get_openai_client")
+    async def test_process_ai_query_openai_error(self, mock_get_client):
         """Test AI query processing with OpenAI error."""
         from src.handlers.ai_query import process_ai_query
 
-        mock_create.side_effect = Exception("API Error")
+        mock_client = mock_get_client.return_value
+        mock_client.chat.completions.create = AsyncMock(
+            side_effect=Exception("API Error")
+        )
 
         with pytest.raises(Exception) as exc_info:
             await process_ai_query("Test question")
@@ -122,13 +222,24 @@ class TestAIQueryHandler:
             or "Sorry" in error_msg
         )
 
+    @pytest.mark.asyncio
+    @patch("src.handlers.ai_query.get_openai_client", return_value=None)
+    async def test_process_ai_query_no_client(self, mock_get_client):
+        """Test AI query processing without a configured OpenAI client."""
+        from src.handlers.ai_query import process_ai_query
+
+        with pytest.raises(Exception) as exc_info:
+            await process_ai_query("Test question")
+
+        assert "AI service error" in str(exc_info.value)
+
     @pytest.mark.asyncio
     @patch("src.handlers.ai_query.process_ai_query")
     async def test_handle_ai_query_processing_error(
         self, mock_process, clear_app_state
     ):
         """Test AI query with processing error."""
-        from src.app import balances
+        from src.state import balances
 
         balances["+1234567890"] = 1.0
         mock_process.side_effect = Exception("Processing failed")
@@ -136,3 +247,28 @@ class TestAIQueryHandler:
         result = await handle_ai_query("+1234567890", "Test question")
 
         assert "Processing failed" in result
+        assert balances["+1234567890"] == 1.0  # Reservation released
+
+    @pytest.mark.asyncio
+    @patch("src.handlers.ai_query.process_ai_query")
+    async def test_handle_ai_query_concurrent_queries_all_charged(
+        self, mock_process, clear_app_state
+    ):
+        """Test that concurrent queries from one user are each charged."""
+        from src.state import balances
+
+        balances["+1234567890"] = 1.0
+
+        async def slow_response(message):
+            await asyncio.sleep(0)
+            return (f"Answer to {message}", 50, 50)
+
+        mock_process.side_effect = slow_response
+
+        await asyncio.gather(
+            handle_ai_query("+1234567890", "First question"),
+            handle_ai_query("+1234567890", "Second question"),
+        )
+
+        # Each query costs 100 tokens = 0.01 HTR
+        assert balances["+1234567890"] == pytest.approx(0.98)
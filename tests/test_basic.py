@@ -5,23 +5,10 @@ Basic Tests for WhatsPayAI Application Structure
 import os
 import sys
 
-import pytest
-
 # Add src to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
 
 
-def test_imports():
-    """Test that all main modules can be imported."""
-    try:
-        from src import app, hathor_client, intent, scheduler, twilio_client
-        from src.handlers import ai_query, balance, help, payment
-
-        assert True
-    except ImportError as e:
-        pytest.fail(f"Import failed: {e}")
-
-
 def test_app_creation():
     """Test that FastAPI app can be created."""
     from src.app import app
@@ -59,15 +46,14 @@ class TestBasicFunctionality:
         assert validate_phone_number("whatsapp:+1234567890") == "+1234567890"
         assert validate_phone_number("invalid") is None
 
-    def test_hathor_address_validation(self):
+    def test_hathor_address_validation(self, monkeypatch):
         """Test Hathor address validation."""
         from src.hathor_client import validate_hathor_address
 
         # Mock testnet environment
-        with pytest.MonkeyPatch.context() as m:
-            m.setattr("src.hathor_client.HATHOR_NETWORK", "testnet")
-            assert validate_hathor_address("WYBwT1234567890abcdef1234567890") is True
-            assert validate_hathor_address("invalid") is False
+        monkeypatch.setattr("src.hathor_client.ADDRESS_PREFIX", "WYBwT")
+        assert validate_hathor_address("WYBwT1234567890abcdef1234567890") is True
+        assert validate_hathor_address("invalid") is False
 
     def test_token_estimation(self):
         """Test token count estimation."""
@@ -2,12 +2,13 @@
 Tests for Hathor Client Module
 """
 
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
 from src.hathor_client import (
     check_incoming_deposits,
+    check_incoming_deposits_async,
     generate_deterministic_address,
     get_address_balance,
     get_user_address,
@@ -33,6 +34,20 @@ class TestHathorClient:
             # Should start with testnet prefix
             assert address1.startswith("WYBwT")
 
+    def test_generate_deterministic_address_hash(self):
+        """Test that the address is derived from sha256 of seed and user_id."""
+        import hashlib
+
+        from src.hathor_client import user_addresses
+
+        user_addresses.pop("hash_test_user", None)
+        expected = hashlib.sha256(b"test_seed:hash_test_user").hexdigest()[:30]
+
+        with patch("src.hathor_client.HATHOR_WALLET_SEED", "test_seed"):
+            address = generate_deterministic_address("hash_test_user")
+
+        assert address == f"WYBwT{expected}"
+
     def test_get_user_address_cached(self):
         """Test getting cached user address."""
         from src.hathor_client import user_addresses
@@ -82,6 +97,30 @@ class TestHathorClient:
         assert len(deposits) == 1
         assert deposits[0] == ("tx123", 1.0)  # Converted from centis
 
+    @pytest.mark.asyncio
+    @patch(
+        "src.hathor_client.hathor_client.get_address_history_async",
+        new_callable=AsyncMock,
+    )
+    async def test_check_incoming_deposits_async(self, mock_get_history):
+        """Test checking incoming deposits on the async client."""
+        mock_get_history.return_value = {
+            "success": True,
+            "history": [
+                {
+                    "tx_id": "tx123",
+                    "outputs": [
+                        {"decoded": {"address": "WYBwT123"}, "value": 250},
+                        {"decoded": {"address": "WYBwTother"}, "value": 100},
+                    ],
+                }
+            ],
+        }
+
+        deposits = await check_incoming_deposits_async("WYBwT123")
+
+        assert deposits == [("tx123", 2.5)]
+
     @patch("src.hathor_client.hathor_client.get_address_history")
     def test_check_incoming_deposits_no_history(self, mock_get_history):
         """Test checking deposits with no history."""
@@ -98,6 +137,28 @@ class TestHathorClient:
         deposits = check_incoming_deposits("WYBwT123")
         assert deposits == []
 
+    def test_make_request_decodes_response_body(self):
+        """Test that node responses are decoded from the raw body."""
+        from src.hathor_client import HathorClient
+
+        client = HathorClient("https://node.example")
+        response = Mock(content=b'{"success": true, "history": []}')
+
+        with patch.object(client.client, "get", return_value=response):
+            result = client.get_address_history("WYBwT123")
+
+        assert result == {"success": True, "history": []}
+
+    def test_make_request_invalid_json(self):
+        """Test that an undecodable body is treated as a failed request."""
+        from src.hathor_client import HathorClient
+
+        client = HathorClient("https://node.example")
+        response = Mock(content=b"<html>bad gateway</html>")
+
+        with patch.object(client.client, "get", return_value=response):
+            assert client.get_address_history("WYBwT123") is None
+
     @patch("src.hathor_client.hathor_client.get_address_info")
     def test_get_address_balance_success(self, mock_get_info):
         """Test getting address balance successfully."""
@@ -125,44 +186,57 @@ class TestHathorClient:
         balance = get_address_balance("WYBwT123")
         assert balance == 0.0
 
-    def test_validate_hathor_address_testnet_valid(self):
+    @pytest.mark.parametrize(
+        "address",
+        [
+            "WYBwT1234567890abcdef1234567890",
+            "WYBwTabcdef1234567890abcdef123456",
+        ],
+    )
+    def test_validate_hathor_address_testnet_valid(self, address, monkeypatch):
         """Test validation of valid testnet addresses."""
-        with patch("src.hathor_client.HATHOR_NETWORK", "testnet"):
-            valid_addresses = [
-                "WYBwT1234567890abcdef1234567890",
-                "WYBwTabcdef1234567890abcdef123456",
-            ]
-
-            for address in valid_addresses:
-                result = validate_hathor_address(address)
-                assert result is True
-
-    def test_validate_hathor_address_mainnet_valid(self):
+        monkeypatch.setattr("src.hathor_client.ADDRESS_PREFIX", "WYBwT")
+        result = validate_hathor_address(address)
+        assert result is True
+
+    @pytest.mark.parametrize(
+        "address",
+        [
+            "H1234567890abcdef1234567890abcd",
+            "Habcdef1234567890abcdef1234567890",
+        ],
+    )
+    def test_validate_hathor_address_mainnet_valid(self, address, monkeypatch):
         """Test validation of valid mainnet addresses."""
-        with patch("src.hathor_client.HATHOR_NETWORK", "mainnet"):
-            valid_addresses = [
-                "H1234567890abcdef1234567890abcd",
-                "Habcdef1234567890abcdef1234567890",
-            ]
+        monkeypatch.setattr("src.hathor_client.ADDRESS_PREFIX", "H")
+        result = validate_hathor_address(address)
+        assert result is True
 
-            for address in valid_addresses:
-                result = validate_hathor_address(address)
-                assert result is True
-
-    def test_validate_hathor_address_invalid(self):
-        """Test validation of invalid addresses."""
-        invalid_addresses = [
+    @pytest.mark.parametrize(
+        "address",
+        [
             "",
             None,
             "invalid",
             "H123",  # Too short
             "WYBwT123",  # Too short for testnet
             "X1234567890abcdef1234567890abcd",  # Wrong prefix
-        ]
+            ["WYBwT1234567890abcdef1234567890"],  # Not a string
+        ],
+    )
+    def test_validate_hathor_address_invalid(self, address):
+        """Test validation of invalid addresses."""
+        result = validate_hathor_address(address)
+        assert result is False
+
+    def test_validate_hathor_address_follows_network(self, monkeypatch):
+        """Test that cached results are not reused after a prefix change."""
+        address = "WYBwT1234567890abcdef1234567890"
+        monkeypatch.setattr("src.hathor_client.ADDRESS_PREFIX", "WYBwT")
+        assert validate_hathor_address(address) is True
 
-        for address in invalid_addresses:
-            result = validate_hathor_address(address)
-            assert result is False
+        monkeypatch.setattr("src.hathor_client.ADDRESS_PREFIX", "H")
+        assert validate_hathor_address(address) is False
 
     def test_submit_transfer_placeholder(self):
         """Test transfer submission (placeholder implementation)."""
@@ -0,0 +1,46 @@
+"""
+Tests for Shared HTTP Client Module
+"""
+
+import pytest
+
+from src.http_client import close_http_client, get_http_client, get_openai_client
+
+
+class TestHttpClient:
+    """Test cases for the shared HTTP client lifecycle."""
+
+    @pytest.mark.asyncio
+    async def test_client_is_reused(self):
+        """Test that callers share one pooled client."""
+        assert get_http_client() is get_http_client()
+
+    @pytest.mark.asyncio
+    async def test_client_recreated_after_close(self):
+        """Test that a later lifespan gets a live client after shutdown."""
+        first = get_http_client()
+
+        await close_http_client()
+
+        second = get_http_client()
+        assert first.is_closed
+        assert second is not first
+        assert not second.is_closed
+
+    @pytest.mark.asyncio
+    async def test_openai_client_follows_pool(self):
+        """Test that the OpenAI client is rebuilt on the new pool."""
+        first = get_openai_client()
+        assert get_openai_client() is first
+
+        await close_http_client()
+
+        assert get_openai_client() is not first
+
+    @pytest.mark.asyncio
+    async def test_openai_client_without_api_key(self, monkeypatch):
+        """Test that no OpenAI client is created without an API key."""
+        await close_http_client()
+        monkeypatch.delenv("OPENAI_API_KEY")
+
+        assert get_openai_client() is None
@@ -0,0 +1,125 @@
+"""
+Integration Tests for the WhatsPayAI HTTP API
+"""
+
+from contextlib import ExitStack
+from unittest.mock import AsyncMock, patch
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from src.handlers.help import HELP_MESSAGE
+
+FORM_HEADERS = {"content-type": "application/x-www-form-urlencoded"}
+
+
+@pytest_asyncio.fixture(scope="session")
+async def client(app):
+    """
+    One async client shared by every test, calling the ASGI app in-process.
+
+    The ASGI transport doesn't send lifespan events, so the startup hooks
+    (state log, scheduler) never run; tests reset state with clear_app_state.
+    """
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as c:
+        yield c
+
+
+class TestEndpoints:
+    """Test cases for the monitoring endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_root(self, client):
+        """Test the health check endpoint."""
+        response = await client.get("/")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "WhatsPayAI is running"
+
+    @pytest.mark.asyncio
+    async def test_stats(self, client, clear_app_state, test_users):
+        """Test that /stats reports the current totals."""
+        from src.state import credit_balance, queue_deposit
+
+        phone, address, seed_balance = test_users["user_a"]
+        credit_balance(phone, seed_balance + 0.5)
+        queue_deposit(address, phone, 1.0)
+
+        response = await client.get("/stats")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "total_users": 1,
+            "total_balance": 1.5,
+            "pending_deposits": 1,
+            "total_queries": 0,
+        }
+
+
+class TestWebhook:
+    """Test cases for the Twilio webhook."""
+
+    @pytest.fixture(scope="class")
+    def external_services(self):
+        """Patch the OpenAI and Twilio boundaries once for the whole class."""
+        with ExitStack() as stack:
+            yield {
+                "classify": stack.enter_context(
+                    patch("src.app.classify_intent_async", new_callable=AsyncMock)
+                ),
+                "send": stack.enter_context(
+                    patch("src.app.send_whatsapp_message", new_callable=AsyncMock)
+                ),
+            }
+
+    @pytest.fixture(scope="class")
+    def payloads(self, test_users):
+        """Webhook form bodies, encoded once for the whole class."""
+        phone, _, _ = test_users["user_a"]
+        sender = f"whatsapp:{phone}"
+        return {
+            "help": urlencode({"From": sender, "Body": " help "}).encode(),
+            "no_body": urlencode({"From": sender}).encode(),
+        }
+
+    @pytest.fixture(autouse=True)
+    def mocks(self, external_services):
+        """Reset the shared mocks before each test."""
+        # Form parsing needs python-multipart
+        pytest.importorskip("multipart")
+
+        for mock in external_services.values():
+            mock.reset_mock(return_value=True, side_effect=True)
+        return external_services
+
+    @pytest.mark.asyncio
+    async def test_webhook_replies_to_message(
+        self, client, mocks, payloads, test_users
+    ):
+        """Test that a message is acknowledged and answered in the background."""
+        phone, _, _ = test_users["user_a"]
+        mocks["classify"].return_value = "help_intent"
+
+        response = await client.post(
+            "/webhook", content=payloads["help"], headers=FORM_HEADERS
+        )
+
+        assert response.status_code == 200
+        assert response.text == "OK"
+        mocks["classify"].assert_awaited_once_with("help")
+        mocks["send"].assert_awaited_once_with(phone, HELP_MESSAGE)
+
+    @pytest.mark.asyncio
+    async def test_webhook_missing_body(self, client, mocks, payloads):
+        """Test that a webhook without a message body is rejected."""
+        response = await client.post(
+            "/webhook", content=payloads["no_body"], headers=FORM_HEADERS
+        )
+
+        assert response.status_code == 400
+        mocks["classify"].assert_not_called()
+        mocks["send"].assert_not_called()
@@ -12,38 +12,47 @@ from src.handlers.payment import (
     handle_payment_request,
 )
 
+# (message, expected amount) for amount extraction
+AMOUNT_CASES = (
+    ("top up 1 HTR", 1.0),
+    ("add 0.5 htr to my account", 0.5),
+    ("deposit 2.5", 2.5),
+    ("I want to top up 10 HTR", 10.0),
+    ("charge 0.001 HTR", 0.001),
+    ("top up 1000 HTR", 1000.0),
+)
+
+# Messages without a usable amount
+INVALID_AMOUNT_MESSAGES = (
+    "top up some HTR",
+    "add money please",
+    "deposit abc HTR",
+    "top up 0 HTR",  # Zero amount
+    "top up 10000 HTR",  # Too large
+)
+
 
 class TestPaymentHandler:
     """Test cases for payment handler."""
 
-    def test_extract_amount_from_message(self):
+    @pytest.mark.parametrize("message,expected", AMOUNT_CASES)
+    def test_extract_amount_from_message(self, message, expected):
         """Test amount extraction from various message formats."""
-        test_cases = [
-            ("top up 1 HTR", 1.0),
-            ("add 0.5 htr to my account", 0.5),
-            ("deposit 2.5", 2.5),
-            ("I want to top up 10 HTR", 10.0),
-            ("charge 0.001 HTR", 0.001),
-            ("top up 1000 HTR", 1000.0),
-        ]
-
-        for message, expected in test_cases:
-            result = extract_amount_from_message(message)
-            assert result == expected, f"Failed for message: {message}"
-
-    def test_extract_amount_invalid_messages(self):
+        result = extract_amount_from_message(message)
+        assert result == expected
+
+    @pytest.mark.parametrize("message", INVALID_AMOUNT_MESSAGES)
+    def test_extract_amount_invalid_messages(self, message):
         """Test amount extraction from invalid messages."""
-        invalid_cases = [
-            "top up some HTR",
-            "add money please",
-            "deposit abc HTR",
-            "top up 0 HTR",  # Zero amount
-            "top up 10000 HTR",  # Too large
-        ]
-
-        for message in invalid_cases:
-            result = extract_amount_from_message(message)
-            assert result is None, f"Should return None for: {message}"
+        result = extract_amount_from_message(message)
+        assert result is None
+
+    def test_extract_amount_cached(self):
+        """Test that a repeated command is answered from the cache."""
+        assert extract_amount_from_message("top up 1 HTR") == 1.0
+        assert extract_amount_from_message("top up 1 HTR") == 1.0
+
+        assert extract_amount_from_message.cache_info().hits == 1
 
     @pytest.mark.asyncio
     @patch("src.hathor_client.get_user_address")
@@ -51,7 +60,7 @@ class TestPaymentHandler:
         self, mock_get_address, clear_app_state
     ):
         """Test handling valid payment request."""
-        from src.app import deposit_queue
+        from src.state import deposit_queue
 
         mock_get_address.return_value = "WYBwT1234567890abcdef"
 
@@ -61,6 +70,45 @@ class TestPaymentHandler:
         assert "1.0 HTR" in result  # Updated to match actual output format
         assert "WYBwT1234567890abcdef" in result
         assert len(deposit_queue) == 1
+        assert deposit_queue["WYBwT1234567890abcdef"]["timestamp"] is not None
+
+    @patch("src.state.time")
+    def test_expire_deposits(self, mock_time, clear_app_state):
+        """Test that only deposits past their TTL are expired."""
+        from src.state import (
+            DEPOSIT_TTL_SECONDS,
+            deposit_queue,
+            expire_deposits,
+            queue_deposit,
+        )
+
+        mock_time.time.return_value = 1000.0
+        queue_deposit("WYBwTold", "+1234567890", 1.0)
+        mock_time.time.return_value = 1060.0
+        queue_deposit("WYBwTnew", "+1234567891", 1.0)
+
+        assert expire_deposits(1000.0 + DEPOSIT_TTL_SECONDS - 1) == []
+        assert expire_deposits(1000.0 + DEPOSIT_TTL_SECONDS) == ["WYBwTold"]
+        assert list(deposit_queue) == ["WYBwTnew"]
+
+    @patch("src.state.time")
+    def test_requeued_deposit_keeps_new_expiry(self, mock_time, clear_app_state):
+        """Test that re-queuing an address replaces its earlier expiry."""
+        from src.state import (
+            DEPOSIT_TTL_SECONDS,
+            deposit_queue,
+            expire_deposits,
+            queue_deposit,
+        )
+
+        mock_time.time.return_value = 1000.0
+        queue_deposit("WYBwT123", "+1234567890", 1.0)
+        mock_time.time.return_value = 1060.0
+        queue_deposit("WYBwT123", "+1234567890", 2.0)
+
+        assert expire_deposits(1000.0 + DEPOSIT_TTL_SECONDS) == []
+        assert deposit_queue["WYBwT123"]["expected_amount"] == 2.0
+        assert expire_deposits(1060.0 + DEPOSIT_TTL_SECONDS) == ["WYBwT123"]
 
     @pytest.mark.asyncio
     async def test_handle_payment_request_invalid_amount(self, clear_app_state):
@@ -73,7 +121,7 @@ class TestPaymentHandler:
     @pytest.mark.asyncio
     async def test_handle_deposit_confirmation(self, clear_app_state):
         """Test deposit confirmation message generation."""
-        from src.app import balances
+        from src.state import balances
 
         balances["+1234567890"] = 1.5
 
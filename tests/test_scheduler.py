@@ -0,0 +1,203 @@
+"""
+Tests for Scheduler Module
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import orjson
+import pytest
+
+from src import scheduler
+from src.scheduler import (
+    DEPOSIT_POLL_SECONDS,
+    DEPOSIT_RECONCILE_SECONDS,
+    _addresses_in_ws_message,
+    _decode_ws_message,
+    _ws_listener,
+    process_deposits,
+)
+
+
+class FakeWebsocket:
+    """Websocket connection replaying scripted node messages."""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.sent = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def send(self, data):
+        self.sent.append(orjson.loads(data))
+
+    async def recv(self):
+        # Each step is a raw message, or a callable run before an empty one;
+        # the listener is stopped once the script runs out
+        if not self.steps:
+            raise asyncio.CancelledError
+        step = self.steps.pop(0)
+        if callable(step):
+            step()
+            return b"{}"
+        return step
+
+
+class TestProcessDeposits:
+    """Test cases for the deposit processing job."""
+
+    @pytest.mark.asyncio
+    @patch("src.scheduler.send_whatsapp_message_safe", new_callable=AsyncMock)
+    @patch("src.scheduler.check_incoming_deposits_async", new_callable=AsyncMock)
+    async def test_process_deposits_credits_paid_addresses(
+        self, mock_check, mock_send, clear_app_state, test_users
+    ):
+        """Test that paid addresses are credited and removed from the queue."""
+        from src.state import balances, deposit_queue, queue_deposit
+
+        paid_phone, paid_address, _ = test_users["user_a"]
+        unpaid_phone, unpaid_address, _ = test_users["user_b"]
+        queue_deposit(paid_address, paid_phone, 1.0)
+        queue_deposit(unpaid_address, unpaid_phone, 1.0)
+        mock_check.side_effect = lambda address: (
+            [("tx1", 0.5), ("tx2", 0.5)] if address == paid_address else []
+        )
+
+        await process_deposits()
+
+        assert mock_check.call_count == 2
+        assert balances[paid_phone] == 1.0
+        assert unpaid_phone not in balances
+        assert list(deposit_queue) == [unpaid_address]
+        assert mock_send.await_count == 2
+
+    @pytest.mark.asyncio
+    @patch("src.scheduler.check_incoming_deposits_async", new_callable=AsyncMock)
+    async def test_process_deposits_empty_queue(self, mock_check, clear_app_state):
+        """Test that an empty queue makes no node requests."""
+        await process_deposits()
+
+        mock_check.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("src.scheduler.send_whatsapp_message_safe", new_callable=AsyncMock)
+    @patch("src.scheduler.check_incoming_deposits_async", new_callable=AsyncMock)
+    async def test_process_deposits_only_given_addresses(
+        self, mock_check, mock_send, clear_app_state
+    ):
+        """Test that a pushed update checks only the addresses it names."""
+        from src.state import queue_deposit
+
+        queue_deposit("WYBwTpushed", "+1234567890", 1.0)
+        queue_deposit("WYBwTquiet", "+1234567891", 1.0)
+        mock_check.return_value = []
+
+        await process_deposits({"WYBwTpushed", "WYBwTunknown"})
+
+        mock_check.assert_awaited_once_with("WYBwTpushed")
+
+
+class TestWebsocketMessages:
+    """Test cases for parsing pushed node updates."""
+
+    def test_address_history_message(self):
+        """Test that address updates name their address and tx outputs."""
+        raw = (
+            b'{"type": "wallet:address_history", "address": "WYBwTa",'
+            b' "history": {"tx_id": "tx1", "outputs": ['
+            b'{"decoded": {"address": "WYBwTb"}, "value": 100}, {"value": 5}]}}'
+        )
+
+        message = _decode_ws_message(raw)
+
+        assert _addresses_in_ws_message(message) == {"WYBwTa", "WYBwTb"}
+
+    def test_unrelated_or_invalid_message(self):
+        """Test that messages without addresses are ignored."""
+        assert _addresses_in_ws_message({"type": "dashboard:metrics"}) == set()
+        assert _decode_ws_message(b"not json") is None
+        assert _decode_ws_message(b"[1, 2]") is None
+
+
+class TestWebsocketListener:
+    """Test cases for the websocket subscription listener."""
+
+    @pytest.fixture
+    def mock_scheduler(self, monkeypatch):
+        """A started scheduler polling at the normal interval."""
+        mock = Mock()
+        monkeypatch.setattr(scheduler, "scheduler", mock)
+        monkeypatch.setattr(scheduler, "_poll_seconds", DEPOSIT_POLL_SECONDS)
+        return mock
+
+    @pytest.mark.asyncio
+    async def test_subscriptions_follow_deposit_queue(
+        self, monkeypatch, mock_scheduler, clear_app_state
+    ):
+        """Test that processed addresses are unsubscribed and forgotten."""
+        from src.state import deposit_queue, queue_deposit
+
+        queue_deposit("WYBwTa", "+1234567890", 1.0)
+        ws = FakeWebsocket(
+            b'{"type": "subscribe_address", "success": true}',
+            lambda: deposit_queue.pop("WYBwTa"),
+        )
+        monkeypatch.setattr(
+            scheduler, "websockets", Mock(connect=Mock(return_value=ws)), raising=False
+        )
+
+        with pytest.raises(asyncio.CancelledError):
+            await _ws_listener()
+
+        assert ws.sent == [
+            {"type": "subscribe_address", "address": "WYBwTa"},
+            {"type": "unsubscribe_address", "address": "WYBwTa"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_poll_slows_only_after_confirmation(
+        self, monkeypatch, mock_scheduler, clear_app_state
+    ):
+        """Test that the poll keeps its interval until a subscription is confirmed."""
+        from src.state import queue_deposit
+
+        queue_deposit("WYBwTa", "+1234567890", 1.0)
+        ws = FakeWebsocket(
+            b'{"type": "subscribe_address", "success": false}',
+            lambda: mock_scheduler.reschedule_job.assert_not_called(),
+            b'{"type": "subscribe_address", "success": true}',
+        )
+        monkeypatch.setattr(
+            scheduler, "websockets", Mock(connect=Mock(return_value=ws)), raising=False
+        )
+
+        with pytest.raises(asyncio.CancelledError):
+            await _ws_listener()
+
+        mock_scheduler.reschedule_job.assert_called_once_with(
+            "process_deposits", trigger="interval", seconds=DEPOSIT_RECONCILE_SECONDS
+        )
+
+    @pytest.mark.asyncio
+    async def test_disconnect_restores_poll_interval(self, monkeypatch, mock_scheduler):
+        """Test that losing the websocket returns the poll to its normal interval."""
+        monkeypatch.setattr(scheduler, "_poll_seconds", DEPOSIT_RECONCILE_SECONDS)
+        monkeypatch.setattr(
+            scheduler,
+            "websockets",
+            Mock(connect=Mock(side_effect=OSError("connection refused"))),
+            raising=False,
+        )
+
+        with patch(
+            "src.scheduler.asyncio.sleep", side_effect=asyncio.CancelledError
+        ), pytest.raises(asyncio.CancelledError):
+            await _ws_listener()
+
+        mock_scheduler.reschedule_job.assert_called_once_with(
+            "process_deposits", trigger="interval", seconds=DEPOSIT_POLL_SECONDS
+        )
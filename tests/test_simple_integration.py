@@ -2,22 +2,100 @@
 Basic Integration Tests for WhatsPayAI Application
 """
 
+from unittest.mock import AsyncMock, patch
+
 import pytest
 
-from src.app import app
+from src.app import _dispatch_message, get_stats
 
 
 class TestBasicIntegration:
     """Basic integration tests that don't require TestClient."""
 
-    def test_app_creation(self):
+    def test_app_creation(self, app):
         """Test that the FastAPI app is created successfully."""
         assert app is not None
         assert app.title == "WhatsPayAI"
 
-    def test_app_routes(self):
+    def test_app_routes(self, app):
         """Test that required routes are registered."""
         route_paths = [route.path for route in app.routes]
         assert "/webhook" in route_paths
         assert "/" in route_paths
         assert "/stats" in route_paths
+
+    def test_create_app_is_cached(self, app):
+        """Test that the factory returns the module-level app instance."""
+        import src.app
+
+        assert src.app.create_app() is app
+        assert src.app.app is app
+
+
+class TestStats:
+    """Test the /stats monitoring endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_stats_track_balance_and_usage(self, clear_app_state):
+        """Test that counters follow balance changes and recorded usage."""
+        from src.state import credit_balance, debit_balance, record_usage
+
+        credit_balance("+1234567890", 1.0)
+        credit_balance("+1234567891", 0.5)
+        debit_balance("+1234567890", 0.25)
+        record_usage("+1234567890", {"timestamp": 0, "cost": 0.25})
+
+        stats = await get_stats()
+
+        assert stats["total_users"] == 2
+        assert stats["total_balance"] == pytest.approx(1.25)
+        assert stats["total_queries"] == 1
+
+
+class TestMessageDispatch:
+    """Test background message dispatch."""
+
+    @pytest.mark.asyncio
+    @patch("src.app.send_whatsapp_message", new_callable=AsyncMock)
+    @patch("src.app.classify_intent_async", new_callable=AsyncMock)
+    async def test_dispatch_routes_to_handler(self, mock_classify, mock_send):
+        """Test that a classified message is routed and the reply is sent."""
+        mock_classify.return_value = "balance_intent"
+        mock_balance = AsyncMock(return_value="Your balance")
+
+        with patch.dict(
+            "src.app._INTENT_DISPATCH",
+            {"balance_intent": lambda sender, _: mock_balance(sender)},
+        ):
+            await _dispatch_message("+1234567890", "balance")
+
+        mock_balance.assert_awaited_once_with("+1234567890")
+        mock_send.assert_awaited_once_with("+1234567890", "Your balance")
+
+    @pytest.mark.asyncio
+    @patch("src.app.send_whatsapp_message", new_callable=AsyncMock)
+    @patch("src.app.handle_ai_query", new_callable=AsyncMock)
+    @patch("src.app.classify_intent_async", new_callable=AsyncMock)
+    async def test_dispatch_defaults_to_ai_query(
+        self, mock_classify, mock_ai_query, mock_send
+    ):
+        """Test that unknown intents fall back to an AI query."""
+        mock_classify.return_value = "unknown_intent"
+        mock_ai_query.return_value = "AI reply"
+
+        await _dispatch_message("+1234567890", "hello")
+
+        mock_ai_query.assert_awaited_once_with("+1234567890", "hello")
+        mock_send.assert_awaited_once_with("+1234567890", "AI reply")
+
+    @pytest.mark.asyncio
+    @patch("src.app.send_whatsapp_message", new_callable=AsyncMock)
+    @patch("src.app.classify_intent_async", new_callable=AsyncMock)
+    async def test_dispatch_sends_error_reply(self, mock_classify, mock_send):
+        """Test that handler failures produce an error reply."""
+        mock_classify.side_effect = Exception("Classifier down")
+
+        await _dispatch_message("+1234567890", "balance")
+
+        mock_send.assert_awaited_once()
+        assert "error" in mock_send.call_args[0][1]
@@ -0,0 +1,277 @@
+"""
+Tests for State Store Module
+"""
+
+import json
+import os
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from src import state_store
+
+
+def empty_state():
+    return {"balances": {}, "usage_logs": {}, "deposit_queue": {}}
+
+
+@pytest.fixture
+def state_paths(tmp_path, monkeypatch):
+    """Open a write-ahead log in a temporary directory."""
+    monkeypatch.setattr(state_store, "_seq", 0)
+    snapshot_path = str(tmp_path / "state.json")
+    log_path = str(tmp_path / "state.log")
+    state_store.open_log(log_path)
+
+    yield snapshot_path, log_path
+
+    state_store.close_log()
+
+
+class TestStateStore:
+    """Test cases for the write-ahead log state store."""
+
+    def test_append_event_writes_json_line(self, state_paths):
+        """Test that each event is appended as one JSON line."""
+        _, log_path = state_paths
+
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 1.5})
+        state_store.append_event("deposit_processed", {"address": "WYBwT123"})
+
+        with open(log_path) as f:
+            lines = f.read().splitlines()
+
+        assert len(lines) == 2
+        assert json.loads(lines[0]) == {
+            "seq": 1,
+            "kind": "balance",
+            "data": {"user_id": "+1234567890", "balance": 1.5},
+        }
+
+    def test_append_event_without_open_log(self, tmp_path):
+        """Test that appending is a no-op when the log is not open."""
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 1})
+        assert list(tmp_path.iterdir()) == []
+
+    def test_replay_log(self, state_paths):
+        """Test replaying events on top of a snapshot."""
+        _, log_path = state_paths
+
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 2.0})
+        state_store.append_event(
+            "usage", {"user_id": "+1234567890", "entry": {"cost": 0.01}}
+        )
+        state_store.append_event(
+            "deposit_queued",
+            {"address": "WYBwT123", "info": {"user_id": "+1234567890"}},
+        )
+        state_store.append_event(
+            "deposit_queued",
+            {"address": "WYBwT456", "info": {"user_id": "+1234567890"}},
+        )
+        state_store.append_event("deposit_processed", {"address": "WYBwT123"})
+
+        state = empty_state()
+        state["balances"]["+1234567890"] = 1.0
+
+        replayed = state_store.replay_log(state, log_path)
+
+        assert replayed == 5
+        assert state["balances"]["+1234567890"] == 2.0
+        assert state["usage_logs"]["+1234567890"] == [{"cost": 0.01}]
+        assert list(state["deposit_queue"]) == ["WYBwT456"]
+
+    def test_replay_address_events(self, state_paths):
+        """Test that derived user addresses are restored from the log."""
+        _, log_path = state_paths
+
+        state_store.append_event(
+            "address", {"user_id": "+1234567890", "address": "WYBwT123"}
+        )
+
+        state = empty_state()
+        assert state_store.replay_log(state, log_path) == 1
+        assert state["user_addresses"] == {"+1234567890": "WYBwT123"}
+
+    def test_flush_events_fsyncs_direct_appends(self, state_paths):
+        """Test that the batched flush fsyncs events appended directly."""
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 1})
+
+        with patch("src.state_store.os.fsync") as mock_fsync:
+            state_store.flush_events()
+            state_store.flush_events()
+
+        mock_fsync.assert_called_once()
+
+    def test_flush_events_fsyncs_without_log_lock(self, state_paths):
+        """Test that events can be logged while the flush is fsyncing."""
+        _, log_path = state_paths
+        real_fsync = os.fsync
+
+        def append_from_other_thread(fd):
+            appender = threading.Thread(
+                target=state_store.append_event,
+                args=("balance", {"user_id": "+1234567890", "balance": 2}),
+            )
+            appender.start()
+            appender.join(timeout=1)
+            assert not appender.is_alive()
+            real_fsync(fd)
+
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 1})
+        with patch("src.state_store.os.fsync", side_effect=append_from_other_thread):
+            state_store.flush_events()
+
+        assert state_store.replay_log(empty_state(), log_path) == 2
+
+    def test_replay_log_skips_torn_line(self, state_paths):
+        """Test that a partially written final line is ignored."""
+        _, log_path = state_paths
+
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 2.0})
+        with open(log_path, "a") as f:
+            f.write('{"kind": "balance", "da')
+
+        state = empty_state()
+        assert state_store.replay_log(state, log_path) == 1
+        assert state["balances"]["+1234567890"] == 2.0
+
+    def test_replay_log_skips_events_in_snapshot(self, state_paths):
+        """Test that events already covered by the snapshot are not reapplied."""
+        _, log_path = state_paths
+
+        for cost in (0.01, 0.02, 0.03):
+            state_store.append_event(
+                "usage", {"user_id": "+1234567890", "entry": {"cost": cost}}
+            )
+
+        # Snapshot taken after the second event, log not yet truncated
+        state = empty_state()
+        state["usage_logs"]["+1234567890"] = [{"cost": 0.01}, {"cost": 0.02}]
+
+        assert state_store.replay_log(state, log_path, after_seq=2) == 1
+        assert state["usage_logs"]["+1234567890"] == [
+            {"cost": 0.01},
+            {"cost": 0.02},
+            {"cost": 0.03},
+        ]
+
+    def test_replay_log_continues_sequence(self, state_paths, monkeypatch):
+        """Test that events appended after a replay are numbered after it."""
+        _, log_path = state_paths
+
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 1})
+        monkeypatch.setattr(state_store, "_seq", 0)
+
+        state_store.replay_log(empty_state(), log_path, after_seq=1)
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 2})
+
+        with open(log_path) as f:
+            assert [json.loads(line)["seq"] for line in f] == [1, 2]
+
+    def test_replay_log_missing_file(self, tmp_path):
+        """Test replaying when no log exists."""
+        state = empty_state()
+        assert state_store.replay_log(state, str(tmp_path / "missing.log")) == 0
+
+    def test_write_snapshot_truncates_log(self, state_paths):
+        """Test that writing a snapshot compacts the log."""
+        snapshot_path, log_path = state_paths
+
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 2.0})
+
+        state = empty_state()
+        state["balances"]["+1234567890"] = 2.0
+        state_store.write_snapshot(state, snapshot_path, log_path)
+
+        assert state_store.load_snapshot(snapshot_path) == {**state, "last_seq": 1}
+        assert state_store.replay_log(empty_state(), log_path) == 0
+
+        # The log keeps accepting events after truncation
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 3.0})
+        assert state_store.replay_log(empty_state(), log_path) == 1
+
+    def test_write_snapshot_serializes_without_log_lock(self, state_paths):
+        """Test that events can be logged while the snapshot is written."""
+        snapshot_path, log_path = state_paths
+        state = empty_state()
+        real_fsync = os.fsync
+
+        def append_from_other_thread(fd):
+            appender = threading.Thread(
+                target=state_store.append_event,
+                args=("balance", {"user_id": "+1234567890", "balance": 5.0}),
+            )
+            appender.start()
+            appender.join(timeout=1)
+            assert not appender.is_alive()
+            real_fsync(fd)
+
+        with patch("src.state_store.os.fsync", side_effect=append_from_other_thread):
+            state_store.write_snapshot(state, snapshot_path, log_path)
+
+        # The concurrent event went to the fresh log, not the snapshot
+        assert state_store.load_snapshot(snapshot_path)["balances"] == {}
+        replayed = empty_state()
+        assert state_store.replay_log(replayed, log_path) == 1
+        assert replayed["balances"] == {"+1234567890": 5.0}
+        assert not os.path.exists(f"{log_path}.old")
+
+    def test_interrupted_snapshot_keeps_old_segment(self, state_paths):
+        """Test that a failed snapshot leaves its events for replay."""
+        snapshot_path, log_path = state_paths
+
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 1.0})
+        with patch("src.state_store.os.fsync", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                state_store.write_snapshot(empty_state(), snapshot_path, log_path)
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 2.0})
+
+        state = empty_state()
+        assert state_store.replay_log(state, log_path) == 2
+        assert state["balances"]["+1234567890"] == 2.0
+
+        # The next snapshot rotates the new events in behind the old segment
+        state_store.append_event("balance", {"user_id": "+1234567890", "balance": 3.0})
+        with open(f"{log_path}.old", "ab") as f:
+            f.write(b'{"kind": "balance", "da')  # Torn line from the crash
+        with patch("src.state_store.os.fsync", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                state_store.write_snapshot(empty_state(), snapshot_path, log_path)
+
+        state = empty_state()
+        assert state_store.replay_log(state, log_path) == 3
+        assert state["balances"]["+1234567890"] == 3.0
+
+    def test_queued_events_flush_in_batch(self, state_paths):
+        """Test that queued events are only written when flushed."""
+        _, log_path = state_paths
+
+        for cost in (0.01, 0.02):
+            state_store.queue_event(
+                "usage", {"user_id": "+1234567890", "entry": {"cost": cost}}
+            )
+        assert state_store.replay_log(empty_state(), log_path) == 0
+
+        assert state_store.flush_events() == 2
+
+        state = empty_state()
+        assert state_store.replay_log(state, log_path) == 2
+        assert state["usage_logs"]["+1234567890"] == [{"cost": 0.01}, {"cost": 0.02}]
+
+    def test_snapshot_drops_queued_events(self, state_paths):
+        """Test that a snapshot supersedes events still waiting to be flushed."""
+        snapshot_path, log_path = state_paths
+
+        state_store.queue_event(
+            "usage", {"user_id": "+1234567890", "entry": {"cost": 0.01}}
+        )
+        state_store.write_snapshot(empty_state(), snapshot_path, log_path)
+
+        assert state_store.flush_events() == 0
+        assert state_store.replay_log(empty_state(), log_path) == 0
+
+    def test_load_snapshot_missing_file(self, tmp_path):
+        """Test loading when no snapshot exists."""
+        assert state_store.load_snapshot(str(tmp_path / "missing.json")) is None
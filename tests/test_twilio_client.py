@@ -2,7 +2,7 @@
 Tests for Twilio Client Module
 """
 
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
@@ -12,67 +12,87 @@ from src.twilio_client import (
     validate_phone_number,
 )
 
+LONG_MESSAGE = "A" * 4500  # Exceeds the 4000 character limit
+
 
 class TestTwilioClient:
     """Test cases for Twilio client."""
 
-    def test_validate_phone_number_valid(self):
-        """Test validation of valid phone numbers."""
-        valid_numbers = [
+    @pytest.mark.parametrize(
+        "number",
+        [
             "+1234567890",
             "+44123456789",
             "+91987654321",
-        ]
-
-        for number in valid_numbers:
-            result = validate_phone_number(number)
-            assert result == number
+        ],
+    )
+    def test_validate_phone_number_valid(self, number):
+        """Test validation of valid phone numbers."""
+        result = validate_phone_number(number)
+        assert result == number
 
     def test_validate_phone_number_with_whatsapp_prefix(self):
         """Test validation of numbers with whatsapp: prefix."""
         result = validate_phone_number("whatsapp:+1234567890")
         assert result == "+1234567890"
 
-    def test_validate_phone_number_invalid(self):
-        """Test validation of invalid phone numbers."""
-        invalid_numbers = [
+    @pytest.mark.parametrize(
+        "number",
+        [
             "1234567890",  # Missing +
             "+abc123456",  # Contains letters
             "",  # Empty
             None,  # None
             "+",  # Just +
-        ]
+            "+\u0661\u0662\u0663\u0664\u0665\u0666\u0667",  # Non-ASCII digits
+            ["+1234567890"],  # Not a string
+        ],
+    )
+    def test_validate_phone_number_invalid(self, number):
+        """Test validation of invalid phone numbers."""
+        result = validate_phone_number(number)
+        assert result is None
 
-        for number in invalid_numbers:
-            result = validate_phone_number(number)
-            assert result is None
+    def test_validate_phone_number_warns_every_time(self, caplog):
+        """Test that repeated invalid numbers are each logged."""
+        validate_phone_number("invalid")
+        validate_phone_number("invalid")
+
+        assert caplog.text.count("Invalid phone number format: invalid") == 2
 
     @pytest.mark.asyncio
-    @patch("src.twilio_client.twilio_client")
-    async def test_send_whatsapp_message_success(self, mock_client):
+    @patch("src.twilio_client.TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
+    @patch("src.twilio_client.twilio_messages_url", "https://twilio.test/Messages")
+    @patch("src.twilio_client.get_http_client")
+    async def test_send_whatsapp_message_success(
+        self, mock_get_client, twilio_message_response
+    ):
         """Test successful WhatsApp message sending."""
-        # Mock Twilio client
-        mock_message = Mock()
-        mock_message.sid = "test_message_sid"
-        mock_client.messages.create.return_value = mock_message
+        mock_post = mock_get_client.return_value.post = AsyncMock()
+        mock_post.return_value = twilio_message_response("test_message_sid")
 
         result = await send_whatsapp_message("+1234567890", "Test message")
 
         assert result is True
-        mock_client.messages.create.assert_called_once()
+        mock_post.assert_awaited_once()
+        assert mock_post.call_args.kwargs["data"]["To"] == "whatsapp:+1234567890"
 
     @pytest.mark.asyncio
-    @patch("src.twilio_client.twilio_client", None)
+    @patch("src.twilio_client.twilio_messages_url", None)
     async def test_send_whatsapp_message_no_client(self):
         """Test message sending with no Twilio client."""
         result = await send_whatsapp_message("+1234567890", "Test message")
         assert result is False
 
     @pytest.mark.asyncio
-    @patch("src.twilio_client.twilio_client")
-    async def test_send_whatsapp_message_exception(self, mock_client):
+    @patch("src.twilio_client.TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
+    @patch("src.twilio_client.twilio_messages_url", "https://twilio.test/Messages")
+    @patch("src.twilio_client.get_http_client")
+    async def test_send_whatsapp_message_exception(self, mock_get_client):
         """Test message sending with exception."""
-        mock_client.messages.create.side_effect = Exception("Twilio error")
+        mock_get_client.return_value.post = AsyncMock(
+            side_effect=Exception("Twilio error")
+        )
 
         result = await send_whatsapp_message("+1234567890", "Test message")
         assert result is False
@@ -106,12 +126,10 @@ class TestTwilioClient:
     @pytest.mark.asyncio
     async def test_send_whatsapp_message_safe_long_message(self):
         """Test safe message sending with long message."""
-        long_message = "A" * 4500  # Exceeds 4000 character limit
-
         with patch("src.twilio_client.send_whatsapp_message") as mock_send:
             mock_send.return_value = True
 
-            result = await send_whatsapp_message_safe("+1234567890", long_message)
+            result = await send_whatsapp_message_safe("+1234567890", LONG_MESSAGE)
 
             assert result is True
             # Check that message was truncated